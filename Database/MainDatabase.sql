@@ -19,6 +19,39 @@
 CREATE DATABASE IF NOT EXISTS `repeater` /*!40100 DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci */;
 USE `repeater`;
 
+-- Dumping structure for table repeater.audio_archive_index
+CREATE TABLE IF NOT EXISTS `audio_archive_index` (
+  `filename` varchar(255) NOT NULL,
+  `archive_file` varchar(255) NOT NULL,
+  `member` varchar(255) NOT NULL,
+  `data_offset` bigint(20) NOT NULL,
+  `data_length` int(11) NOT NULL,
+  `archived_at` timestamp NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`filename`),
+  KEY `idx_aai_archive` (`archive_file`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
+-- Dumping structure for table repeater.audio_screening
+CREATE TABLE IF NOT EXISTS `audio_screening` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `filename` varchar(255) NOT NULL,
+  `classification` enum('speech','tone','silence') NOT NULL,
+  `action` enum('transcribe','skipped') NOT NULL,
+  `duration_s` decimal(10,3) DEFAULT NULL,
+  `active_s` decimal(10,3) DEFAULT NULL,
+  `rms_dbfs` decimal(6,2) DEFAULT NULL,
+  `peak_ratio` decimal(5,4) DEFAULT NULL,
+  `flatness` decimal(5,4) DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `idx_as_filename` (`filename`),
+  KEY `idx_as_class_created` (`classification`,`created_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
 -- Dumping structure for table repeater.callsigns
 CREATE TABLE IF NOT EXISTS `callsigns` (
   `ID` int(11) NOT NULL AUTO_INCREMENT,
@@ -152,6 +185,19 @@ CREATE TABLE IF NOT EXISTS `callsign_profile_history` (
 
 -- Data exporting was unselected.
 
+-- Dumping structure for table repeater.callsign_qrz_checks
+CREATE TABLE IF NOT EXISTS `callsign_qrz_checks` (
+  `callsign` varchar(16) NOT NULL,
+  `status` enum('valid','not_found','error') NOT NULL,
+  `checked_at` datetime NOT NULL DEFAULT current_timestamp(),
+  `next_check` datetime NOT NULL,
+  `attempts` int(11) NOT NULL DEFAULT 1,
+  PRIMARY KEY (`callsign`),
+  KEY `idx_cqc_next_check` (`next_check`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
 -- Dumping structure for table repeater.callsign_topics
 CREATE TABLE IF NOT EXISTS `callsign_topics` (
   `id` int(11) NOT NULL AUTO_INCREMENT,
@@ -586,7 +632,9 @@ CREATE TABLE IF NOT EXISTS `transcriptions` (
   `processed` tinyint(1) NOT NULL DEFAULT 0,
   `analyzed` tinyint(4) DEFAULT 0,
   PRIMARY KEY (`id`),
-  KEY `idx_transcriptions_analyzed` (`analyzed`)
+  KEY `idx_transcriptions_analyzed` (`analyzed`),
+  KEY `idx_transcriptions_filename` (`filename`),
+  KEY `idx_transcriptions_processed` (`processed`,`id`)
 ) ENGINE=InnoDB AUTO_INCREMENT=46048 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 -- Data exporting was unselected.
@@ -629,6 +677,53 @@ CREATE TABLE IF NOT EXISTS `transcription_analysis` (
 
 -- Data exporting was unselected.
 
+-- Dumping structure for table repeater.transcription_duplicates
+CREATE TABLE IF NOT EXISTS `transcription_duplicates` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `filename` varchar(255) NOT NULL,
+  `transcription_id` int(11) NOT NULL,
+  `content_hash` char(40) NOT NULL,
+  `created_at` timestamp NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  KEY `idx_td_transcription` (`transcription_id`),
+  KEY `idx_td_hash` (`content_hash`),
+  CONSTRAINT `fk_td_transcription` FOREIGN KEY (`transcription_id`) REFERENCES `transcriptions` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
+-- Dumping structure for table repeater.transcription_segments
+CREATE TABLE IF NOT EXISTS `transcription_segments` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `transcription_id` int(11) NOT NULL,
+  `seq` smallint(6) NOT NULL,
+  `start_s` decimal(10,3) NOT NULL,
+  `end_s` decimal(10,3) NOT NULL,
+  `text` text DEFAULT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_ts_transcription_seq` (`transcription_id`,`seq`),
+  CONSTRAINT `fk_ts_transcription` FOREIGN KEY (`transcription_id`) REFERENCES `transcriptions` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
+-- Dumping structure for table repeater.transcription_versions
+CREATE TABLE IF NOT EXISTS `transcription_versions` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `transcription_id` int(11) NOT NULL,
+  `version` smallint(6) NOT NULL,
+  `engine` varchar(32) NOT NULL,
+  `model` varchar(64) NOT NULL,
+  `transcription` text DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT current_timestamp(),
+  PRIMARY KEY (`id`),
+  UNIQUE KEY `uk_tv_transcription_version` (`transcription_id`,`version`),
+  KEY `idx_tv_engine_model` (`engine`,`model`),
+  CONSTRAINT `fk_tv_transcription` FOREIGN KEY (`transcription_id`) REFERENCES `transcriptions` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- Data exporting was unselected.
+
 -- Dumping structure for view repeater.vw_callsign_net_open_bias
 -- Creating temporary table to overcome VIEW dependency errors
 CREATE TABLE `vw_callsign_net_open_bias` (
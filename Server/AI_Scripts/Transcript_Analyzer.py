@@ -31,6 +31,7 @@ python3 Transcript_Analyzer.py
 from __future__ import annotations
 import os
 import re
+import sys
 import json
 import logging
 from dataclasses import dataclass, field
@@ -47,6 +48,11 @@ try:
 except Exception:
     mysql = None
 
+# Shared corrections engine and callsign resolver (Server/, one level up)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from text_corrections import CorrectionsTrie, load_corrections_trie
+from callsign_resolver import CallsignResolver, load_callsign_resolver
+
 # AI backend (local file ai_backend.py)
 try:
     from ai_backend import ai_infer_session, should_call_ai
@@ -202,44 +208,43 @@ def get_db():
     return cnx
 
 # --------- Phonetic corrections map ---------
-def load_corrections_map(cur) -> Dict[str, str]:
-    """Load corrections table into {detect -> correct} lowercased."""
+def load_corrections_map(cur) -> CorrectionsTrie:
+    """Compiled corrections trie (multi-word aware, cached per process)."""
     try:
-        cur.execute("SELECT `detect`,`correct` FROM corrections")
-        rows = cur.fetchall()
-        mp = {}
-        for det, cor in rows:
-            d = (det or "").strip().lower()
-            c = (cor or "").strip().lower()
-            if d and c:
-                mp[d] = c
-        return mp
+        return load_corrections_trie(cur)
     except Exception:
-        return {}
+        return CorrectionsTrie()
 
-def normalize_callsign_or_phonetic(s: Optional[str], corr: Optional[Dict[str,str]] = None) -> Optional[str]:
+def load_resolver(cur) -> Optional[CallsignResolver]:
+    """Nearest-validated-callsign resolver (cached per process), or None if it cannot be loaded."""
+    try:
+        return load_callsign_resolver(cur)
+    except Exception:
+        return None
+
+def normalize_callsign_or_phonetic(s: Optional[str], corr: Optional[CorrectionsTrie] = None,
+                                   resolver: Optional[CallsignResolver] = None) -> Optional[str]:
     """
     Turn phonetics like 'Victor Alpha 3 Echo Whiskey Victor' -> 'VA3EWV'.
-    Returns valid callsign (per CALLSIGN_RE) or None.
+    Returns valid callsign (per CALLSIGN_RE) or None. With a resolver, a
+    callsign one (weighted) edit from a validated one is snapped to it.
     """
     if not s:
         return None
     s0 = clean_text(s) or ""
     s0 = s0.replace("-", " ").replace("/", " ").strip()
     if CALLSIGN_RE.fullmatch(s0.upper()):
-        return s0.upper()
-    corr = corr or {}
-    out = []
-    for tok in re.split(r"\s+", s0.lower()):
-        if not tok:
-            continue
-        if tok in corr:
-            out.append(corr[tok])
-        else:
-            out.append(re.sub(r"[^a-z0-9]", "", tok))
-    flat = "".join(out).upper()
-    m = CALLSIGN_RE.search(flat)
-    return m.group(1).upper() if m else None
+        cs = s0.upper()
+    else:
+        tokens = [re.sub(r"[^a-z0-9]", "", tok) for tok in re.split(r"\s+", s0.lower()) if tok]
+        if corr:
+            tokens = corr.correct_tokens(tokens)
+        flat = "".join(tokens).upper()
+        m = CALLSIGN_RE.search(flat)
+        if not m:
+            return None
+        cs = m.group(1).upper()
+    return resolver.resolve(cs) if resolver else cs
 
 # --------------- Name extraction (regex) ---------------
 def clip_net_name(name: Optional[str]) -> Optional[str]:
@@ -443,11 +448,12 @@ def upsert_participation(cur, net_id: int, callsign: str, first_time: datetime,
     cur.execute(sql, (net_id, callsign_id, callsign.upper(), first_time, last_time, tx_count, talk_seconds, checkin_type))
 
 
-def insert_callsign_topic(cur, net_id: int, callsign: str, description: str, corr: Dict[str, str]):
+def insert_callsign_topic(cur, net_id: int, callsign: str, description: str, corr: CorrectionsTrie,
+                          resolver: Optional[CallsignResolver] = None):
     """Insert a single operator topic description into callsign_topics (if callsign can be normalized)."""
     if not description:
         return
-    cs_norm = normalize_callsign_or_phonetic(callsign, corr)
+    cs_norm = normalize_callsign_or_phonetic(callsign, corr, resolver)
     if not cs_norm:
         return
     callsign_id = ensure_callsign(cur, cs_norm)
@@ -580,6 +586,7 @@ def main():
 
         # Load phonetic corrections once
         corr_map = load_corrections_map(cur)
+        resolver = load_resolver(cur)
 
         for sess in sessions:
             score, hits = score_session_for_net(sess)
@@ -623,7 +630,7 @@ def main():
                         summary_text = ai.summary
                     # normalize NCS callsign using phonetics map
                     ncs_raw = getattr(ai, "ncs_callsign", None)
-                    ncs_norm = normalize_callsign_or_phonetic(ncs_raw, corr_map)
+                    ncs_norm = normalize_callsign_or_phonetic(ncs_raw, corr_map, resolver)
                     if ncs_norm:
                         ncs = ncs_norm
                     if AI_LOG:
@@ -671,7 +678,7 @@ def main():
                                         )
                             inserted = 0
                             for raw_cs, desc in op_map.items():
-                                insert_callsign_topic(cur, net_id, str(raw_cs), str(desc).strip(), corr_map)
+                                insert_callsign_topic(cur, net_id, str(raw_cs), str(desc).strip(), corr_map, resolver)
                                 inserted += 1
                             if inserted and AI_LOG:
                                 logger.info("Stored %d operator topic descriptions into callsign_topics", inserted)
@@ -690,7 +697,7 @@ def main():
             if net_id is not None:
                 roster = {}
                 for t in sess.transcripts:
-                    calls_this_line = set(m.upper() for m in CALLSIGN_RE.findall(t.text))
+                    calls_this_line = set(resolver.resolve(m) if resolver else m.upper() for m in CALLSIGN_RE.findall(t.text))
                     if not calls_this_line:
                         continue
                     stripped = re.sub(r"[^A-Za-z0-9/ ]", "", t.text).strip()
@@ -726,7 +733,7 @@ def main():
 
             # Per-transcript analysis (even if name missing, net_id stays NULL)
             for t in sess.transcripts:
-                calls = [m.upper() for m in CALLSIGN_RE.findall(t.text)]
+                calls = [resolver.resolve(m) if resolver else m.upper() for m in CALLSIGN_RE.findall(t.text)]
                 topics = detect_topics(t.text)
                 ncs_cand = 1 if (ncs and ncs in calls) else 0
                 detected_name_for_row = net_name if create_net else None
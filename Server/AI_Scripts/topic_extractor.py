@@ -20,6 +20,7 @@ Writes:
 
 import os
 import re
+import sys
 import json
 from datetime import datetime, timedelta
 
@@ -28,6 +29,10 @@ import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+# Shared corrections engine (Server/text_corrections.py, one level up)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from text_corrections import load_corrections_trie
+
 # ---------- ENV HELP ----------
 def env(key, default=None):
     v = os.getenv(key, default)
@@ -127,27 +132,15 @@ def mark_analyzed(conn, transcript_id: int):
         cur.execute("UPDATE transcriptions SET analyzed=1 WHERE id=%s", (transcript_id,))
 
 def load_corrections(conn):
-    """List of (detect, correct) from corrections table."""
-    sql = "SELECT detect, correct FROM corrections WHERE detect IS NOT NULL AND correct IS NOT NULL"
-    pairs = []
+    """Compiled corrections trie (see text_corrections.py), cached per process."""
     with conn.cursor() as cur:
-        cur.execute(sql)
-        for r in cur.fetchall():
-            d = (r["detect"] or "").strip()
-            c = (r["correct"] or "").strip()
-            if d and c:
-                pairs.append((d, c))
-    return pairs
-
-def apply_corrections(text: str, pairs) -> str:
-    """Apply detect->correct (case-insensitive); word boundaries if detect is alnum."""
-    if not text or not pairs:
+        return load_corrections_trie(cur)
+
+def apply_corrections(text: str, corrections) -> str:
+    """Apply detect->correct in one pass, keeping the rest of the text as is."""
+    if not text or not corrections:
         return text
-    out = text
-    for detect, correct in pairs:
-        pattern = r"\b" + re.escape(detect) + r"\b" if detect.isalnum() else re.escape(detect)
-        out = re.sub(pattern, correct, out, flags=re.IGNORECASE)
-    return out
+    return corrections.apply_preserving(text)
 
 def callsigns_from_smoothed(conn, transcript_id: int) -> set[str]:
     """Extract trusted callsigns from smoothed_transcripts.callsigns_json."""
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Content-hash index of transcribed WAVs.
+
+push-taas-wavs.sh retries uploads and several nodes can send the same
+recording, so transcribe_watcher.py hashes the PCM payload of every file
+(the WAV header is ignored) before decoding it. A hash that has already
+been transcribed is linked to the existing `transcriptions` row instead.
+
+The index is a small SQLite file next to the watcher:
+
+  pcm_hashes(digest, filename, transcription_id, created_at)
+
+A row with transcription_id NULL is a file that is still being decoded.
+"""
+
+import time
+import wave
+import sqlite3
+import hashlib
+
+READ_FRAMES = 65536
+
+def pcm_digest(path):
+    """blake2b of the sample format plus the raw PCM frames."""
+    h = hashlib.blake2b(digest_size=20)
+    with wave.open(path, "rb") as w:
+        h.update(f"{w.getnchannels()}:{w.getsampwidth()}:{w.getframerate()}:".encode())
+        while True:
+            chunk = w.readframes(READ_FRAMES)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+class DedupeIndex:
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pcm_hashes (
+                digest TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                transcription_id INTEGER,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_pcm_filename ON pcm_hashes (filename)")
+        self.conn.commit()
+
+    def lookup(self, digest):
+        """Return (filename, transcription_id) for a known digest, else None."""
+        return self.conn.execute(
+            "SELECT filename, transcription_id FROM pcm_hashes WHERE digest = ?", (digest,)
+        ).fetchone()
+
+    def claim(self, digest, filename):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pcm_hashes (digest, filename, transcription_id, created_at) "
+            "VALUES (?, ?, NULL, ?)", (digest, filename, time.time())
+        )
+        self.conn.commit()
+
+    def resolve(self, filename, transcription_id):
+        self.conn.execute(
+            "UPDATE pcm_hashes SET transcription_id = ? WHERE filename = ?",
+            (transcription_id, filename)
+        )
+        self.conn.commit()
+
+    def forget(self, filename):
+        """Drop a claim whose transcription failed so a copy can be decoded."""
+        self.conn.execute(
+            "DELETE FROM pcm_hashes WHERE filename = ? AND transcription_id IS NULL", (filename,)
+        )
+        self.conn.commit()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Energy-based screening of incoming WAVs before they reach Whisper.
+
+Kerchunks, courtesy tones and dead-carrier recordings from the AllStar hub
+decode to hallucinated text, so each file is classified first:
+
+  silence  less than MIN_SPEECH_SEC of frames above SILENCE_DBFS, or a
+           steady broadband carrier with no syllabic energy changes
+  tone     most of the voice-band energy sits in a single narrow peak
+  speech   everything else
+
+All per-frame work (RMS, spectra, flatness) is vectorized with NumPy.
+
+split_at_silence() uses the same frame energies to cut long recordings at
+pauses so the pieces can be decoded in parallel.
+
+Usage: python3 audio_vad.py <file.wav> [...]
+"""
+
+import os
+import sys
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+FRAME_MS = 30
+SILENCE_DBFS = float(os.getenv("VAD_SILENCE_DBFS", "-45"))
+MIN_SPEECH_SEC = float(os.getenv("VAD_MIN_SPEECH_SEC", "0.6"))
+TONE_PEAK_RATIO = float(os.getenv("VAD_TONE_PEAK_RATIO", "0.5"))
+CARRIER_FLATNESS = float(os.getenv("VAD_CARRIER_FLATNESS", "0.35"))
+CARRIER_ENERGY_STD_DB = float(os.getenv("VAD_CARRIER_ENERGY_STD_DB", "3.0"))
+# Spectral checks only look at the voice band so CTCSS does not count as a tone.
+VOICE_BAND_HZ = (300, 3400)
+MAX_SPECTRAL_FRAMES = 400
+
+VadResult = namedtuple("VadResult", "label duration active_sec rms_dbfs peak_ratio flatness")
+
+def read_pcm(path, start=None, end=None):
+    """
+    Return (mono float32 samples in [-1, 1], sample rate), optionally only
+    for the [start, end) range in seconds.
+    """
+    with wave.open(path, "rb") as w:
+        channels = w.getnchannels()
+        width = w.getsampwidth()
+        rate = w.getframerate()
+        first = int(start * rate) if start else 0
+        last = min(int(end * rate), w.getnframes()) if end else w.getnframes()
+        w.setpos(first)
+        raw = w.readframes(max(0, last - first))
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {width} bytes")
+
+    if channels > 1:
+        samples = samples[: len(samples) - len(samples) % channels]
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+def frame_signal(samples, rate, frame_ms=FRAME_MS):
+    frame_len = max(1, int(rate * frame_ms / 1000))
+    n_frames = len(samples) // frame_len
+    return samples[: n_frames * frame_len].reshape(n_frames, frame_len), frame_len
+
+def to_dbfs(x):
+    return 20.0 * np.log10(np.maximum(x, 1e-10))
+
+def classify_samples(samples, rate):
+    duration = len(samples) / float(rate) if rate else 0.0
+    frames, frame_len = frame_signal(samples, rate)
+    if len(frames) == 0:
+        return VadResult("silence", duration, 0.0, -100.0, 0.0, 0.0)
+
+    rms_db = to_dbfs(np.sqrt(np.mean(frames ** 2, axis=1)))
+    active = rms_db > SILENCE_DBFS
+    active_sec = float(active.sum()) * frame_len / float(rate)
+    overall_db = float(to_dbfs(np.sqrt(np.mean(samples ** 2))))
+
+    if active_sec < MIN_SPEECH_SEC:
+        return VadResult("silence", duration, active_sec, overall_db, 0.0, 0.0)
+
+    voiced = frames[active]
+    if len(voiced) > MAX_SPECTRAL_FRAMES:
+        pick = np.linspace(0, len(voiced) - 1, MAX_SPECTRAL_FRAMES).astype(int)
+        voiced = voiced[pick]
+
+    window = np.hanning(frame_len).astype(np.float32)
+    power = np.abs(np.fft.rfft(voiced * window, axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frame_len, 1.0 / rate)
+    band = (freqs >= VOICE_BAND_HZ[0]) & (freqs <= VOICE_BAND_HZ[1])
+    power = power[:, band] + 1e-12
+
+    # Share of voice-band energy within +/-1 bin of the strongest peak.
+    total = power.sum(axis=1)
+    peak = power.argmax(axis=1)
+    padded = np.pad(power, ((0, 0), (1, 1)))
+    rows = np.arange(len(power))
+    near_peak = padded[rows, peak] + padded[rows, peak + 1] + padded[rows, peak + 2]
+    peak_ratio = float(np.median(near_peak / total))
+
+    # Geometric over arithmetic mean: ~1 for hiss, ~0 for tones and voice.
+    flatness = float(np.median(np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)))
+    energy_std = float(np.std(rms_db[active]))
+
+    if peak_ratio >= TONE_PEAK_RATIO:
+        label = "tone"
+    elif flatness >= CARRIER_FLATNESS and energy_std < CARRIER_ENERGY_STD_DB:
+        label = "silence"
+    else:
+        label = "speech"
+    return VadResult(label, duration, active_sec, overall_db, peak_ratio, flatness)
+
+def classify_wav(path):
+    samples, rate = read_pcm(path)
+    return classify_samples(samples, rate)
+
+def split_at_silence(samples, rate, target_sec=30.0, min_gap_sec=0.3):
+    """
+    Return [(start_sec, end_sec), ...] covering the whole recording, cut in
+    the middle of pauses. Pieces run from half to 1.5x target_sec; a piece
+    with no pause in that range is cut hard at the upper limit.
+    """
+    total = len(samples)
+    frames, frame_len = frame_signal(samples, rate)
+    if len(frames) == 0:
+        return [(0.0, total / float(rate))]
+
+    rms_db = to_dbfs(np.sqrt(np.mean(frames ** 2, axis=1)))
+    # FM hiss between words can sit above SILENCE_DBFS, so also accept
+    # frames within 6 dB of the recording's own noise floor.
+    gap_db = max(SILENCE_DBFS, float(np.percentile(rms_db, 10)) + 6.0)
+    quiet = np.concatenate(([False], rms_db <= gap_db, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(quiet))
+    starts, ends = edges[0::2], edges[1::2]
+    min_gap = max(1, int(min_gap_sec * 1000 / FRAME_MS))
+    keep = (ends - starts) >= min_gap
+    cuts = ((starts[keep] + ends[keep]) // 2) * frame_len
+
+    min_len = int(target_sec * 0.5 * rate)
+    max_len = int(target_sec * 1.5 * rate)
+    target = int(target_sec * rate)
+    bounds = []
+    pos = 0
+    while total - pos > max_len:
+        lo = np.searchsorted(cuts, pos + min_len)
+        hi = np.searchsorted(cuts, pos + max_len, side="right")
+        if hi > lo:
+            window = cuts[lo:hi]
+            cut = int(window[np.abs(window - (pos + target)).argmin()])
+        else:
+            cut = pos + max_len
+        bounds.append((pos / float(rate), cut / float(rate)))
+        pos = cut
+    bounds.append((pos / float(rate), total / float(rate)))
+    return bounds
+
+if __name__ == "__main__":
+    for arg in sys.argv[1:]:
+        r = classify_wav(arg)
+        print(f"{os.path.basename(arg)}: {r.label} duration={r.duration:.1f}s "
+              f"active={r.active_sec:.1f}s rms={r.rms_dbfs:.1f}dBFS "
+              f"peak={r.peak_ratio:.2f} flatness={r.flatness:.2f}")
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Re-run callsign extraction over transcripts that were already processed,
+after the corrections table or the extraction code has changed.
+
+The id range is cut into shards of about --shard-size transcripts. Each
+shard is extracted in a process pool with its own MySQL connection, using
+the same steps as callsign_extractor.process_transcript_entry. Nothing is
+written until every shard is done. Then, in one transaction:
+
+  - the callsign_log rows of the re-extracted transcripts are replaced
+  - callsigns.seen_count is moved by (new sightings - old sightings) per
+    callsign, so counts from earlier runs are replaced rather than added to
+
+Transcripts still waiting for the extractor (processed = 0) are left to it.
+
+The original extractor logged each sighting against the previously processed
+transcript (or 0), so old callsign_log rows cannot be trusted per transcript.
+A run over all transcripts therefore sets seen_count from callsigns directly
+(new - current seen_count) and drops the orphaned transcript_id = 0 rows.
+Partial --from-id/--to-id runs rely on the log and are refused unless
+--log-is-current says every row in the range was written by the current
+extractor or a previous full backfill.
+
+It is safe to run beside callsign_extractor.py --daemon. The id range,
+the transcripts still pending inside it and the seen_count baseline are
+read in one consistent snapshot before extraction starts, so sightings the
+daemon commits meanwhile are neither subtracted nor counted twice.
+
+Usage:
+  python3 callsign_backfill.py [--workers 4] [--shard-size 2000]
+                               [--from-id N --to-id N --log-is-current] [--dry-run]
+"""
+
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+
+import callsign_extractor as ce
+
+LOG_CHUNK = 1000  # ids per DELETE/SELECT ... IN (...)
+
+# ----------------------------
+# Worker
+# ----------------------------
+
+_conn = None
+_corrections = None
+
+def init_worker():
+    global _conn, _corrections
+    ce.VERBOSE = False
+    _conn = ce.get_mysql_connection()
+    _corrections = ce.prepare_run(_conn)
+
+def extract_shard(shard):
+    """Extract one (first_id, last_id, skip) shard; returns (ids, deltas, log_rows)."""
+    first_id, last_id, skip = shard
+    _conn.ping(reconnect=True, attempts=3, delay=1)
+    cursor = _conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT id, filename, transcription, COALESCE(timestamp, created_at) AS timestamp
+        FROM transcriptions
+        WHERE id BETWEEN %s AND %s AND processed <> 0
+        ORDER BY id
+    """, (first_id, last_id))
+    # Pending at the snapshot: the extractor is counting these itself.
+    rows = [row for row in cursor.fetchall() if row['id'] not in skip]
+    cursor.close()
+
+    # Collects sightings like the extractor does, but is never flushed.
+    writer = ce.CallsignWriter(_conn)
+    for row in rows:
+        ce.process_transcript_entry(row, _corrections, writer)
+    seen_at = {row['id']: row['timestamp'] for row in rows}
+    log_rows = [(cs, tid, seen_at[tid]) for cs, tid in writer.log_rows]
+    return [row['id'] for row in rows], writer.deltas, log_rows
+
+# ----------------------------
+# Shards & Merge
+# ----------------------------
+
+def get_id_range(conn, from_id=None, to_id=None):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT MIN(id), MAX(id), COUNT(*) FROM transcriptions "
+        "WHERE processed <> 0 AND id BETWEEN %s AND %s",
+        (from_id or 0, to_id or 2**31 - 1)
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    return row
+
+def get_pending_ids(conn, first_id, last_id):
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM transcriptions WHERE processed = 0 AND id BETWEEN %s AND %s",
+                   (first_id, last_id))
+    pending = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return pending
+
+def take_snapshot(conn, from_id, to_id, full):
+    """
+    (first_id, last_id, total, pending, baseline) in one consistent read.
+    The extractor commits sightings together with processed = 1, so the
+    transcripts counted in `baseline` are exactly the processed ones.
+    """
+    conn.start_transaction(consistent_snapshot=True, readonly=True)
+    try:
+        first_id, last_id, total = get_id_range(conn, from_id, to_id)
+        pending = get_pending_ids(conn, first_id, last_id) if total else set()
+        baseline = None
+        if full:
+            cursor = conn.cursor()
+            baseline = get_seen_counts(cursor)
+            cursor.close()
+    finally:
+        conn.commit()
+    return first_id, last_id, total, pending, baseline
+
+def make_shards(first_id, last_id, total, shard_size, pending=()):
+    """Equal-width id ranges expected to hold about shard_size transcripts each."""
+    span = last_id - first_id + 1
+    count = max(1, -(-total // shard_size))
+    width = -(-span // count)
+    return [(lo, hi, {i for i in pending if lo <= i <= hi})
+            for lo, hi in ((lo, min(lo + width - 1, last_id)) for lo in range(first_id, last_id + 1, width))]
+
+def merge_deltas(total, deltas):
+    for cs, d in deltas.items():
+        t = total.get(cs)
+        if t is None:
+            total[cs] = list(d)
+        else:
+            t[0] += d[0]
+            t[1] = min(t[1], d[1])
+            t[2] = max(t[2], d[2])
+            t[3] = max(t[3], d[3])
+
+def get_old_counts(cursor, ids):
+    counts = {}
+    for i in range(0, len(ids), LOG_CHUNK):
+        chunk = ids[i:i + LOG_CHUNK]
+        cursor.execute(
+            f"SELECT callsign, COUNT(*) FROM callsign_log "
+            f"WHERE transcript_id IN ({', '.join(['%s'] * len(chunk))}) GROUP BY callsign",
+            chunk
+        )
+        for callsign, count in cursor.fetchall():
+            counts[callsign] = counts.get(callsign, 0) + count
+    return counts
+
+def get_seen_counts(cursor):
+    """Current callsigns.seen_count, the baseline for a full run."""
+    cursor.execute("SELECT callsign, seen_count FROM callsigns WHERE seen_count > 0")
+    return {callsign: count for callsign, count in cursor.fetchall()}
+
+def count_orphan_rows(cursor):
+    """callsign_log rows the original extractor wrote before its first transcript id."""
+    cursor.execute("SELECT COUNT(*) FROM callsign_log WHERE transcript_id = 0")
+    return cursor.fetchone()[0]
+
+def apply_backfill(conn, ids, deltas, log_rows, old_counts, full=False):
+    """Swap the callsign_log rows of `ids` and move seen_count by new - old."""
+    conn.ping(reconnect=True, attempts=3, delay=1)
+    cursor = conn.cursor()
+    try:
+        if full:
+            cursor.execute("DELETE FROM callsign_log WHERE transcript_id = 0")
+        for i in range(0, len(ids), LOG_CHUNK):
+            chunk = ids[i:i + LOG_CHUNK]
+            cursor.execute(
+                f"DELETE FROM callsign_log WHERE transcript_id IN ({', '.join(['%s'] * len(chunk))})",
+                chunk
+            )
+        for i in range(0, len(log_rows), LOG_CHUNK):
+            cursor.executemany(
+                "INSERT INTO callsign_log (callsign, transcript_id, timestamp) VALUES (%s, %s, %s)",
+                log_rows[i:i + LOG_CHUNK]
+            )
+
+        net = {}
+        for cs, d in deltas.items():
+            net[cs] = [d[0] - old_counts.get(cs, 0), d[1], d[2], d[3]]
+        ce.upsert_callsigns(cursor, net)
+        dropped = [(count, cs) for cs, count in old_counts.items() if cs not in deltas]
+        if dropped:
+            cursor.executemany("UPDATE callsigns SET seen_count = seen_count - %s WHERE callsign = %s", dropped)
+        # A partial run on counts kept before callsign_log existed can go below zero.
+        cursor.execute("UPDATE callsigns SET seen_count = 0 WHERE seen_count < 0")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m" if seconds >= 3600 else f"{seconds // 60}m{seconds % 60:02d}s"
+
+# ----------------------------
+# Runner
+# ----------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-extract callsigns from already processed transcripts.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--shard-size", type=int, default=2000, help="transcripts per shard (approximate)")
+    parser.add_argument("--from-id", type=int)
+    parser.add_argument("--to-id", type=int)
+    parser.add_argument("--log-is-current", action="store_true",
+                        help="allow --from-id/--to-id: callsign_log in the range holds correct transcript ids")
+    parser.add_argument("--dry-run", action="store_true", help="report the count changes without writing")
+    args = parser.parse_args()
+
+    full = args.from_id is None and args.to_id is None
+    if not full and not args.log_is_current:
+        print("[BACKFILL] --from-id/--to-id subtract the old callsign_log rows of the range, and logs "
+              "from the original extractor point at the wrong transcript. Run once without a range, "
+              "or pass --log-is-current if the range was logged by the current extractor.")
+        return 2
+
+    conn = ce.get_mysql_connection()
+    try:
+        first_id, last_id, total, pending, baseline = take_snapshot(conn, args.from_id, args.to_id, full)
+        if not full:
+            cursor = conn.cursor()
+            orphans = count_orphan_rows(cursor)
+            cursor.close()
+            if orphans:
+                print(f"[BACKFILL] callsign_log still has {orphans} rows from the original extractor "
+                      f"(transcript_id = 0). Run once without --from-id/--to-id first.")
+                return 2
+        if not total:
+            print("[BACKFILL] No processed transcripts in range.")
+            return
+        shards = make_shards(first_id, last_id, total, args.shard_size, pending)
+        print(f"[BACKFILL] {total} transcripts, ids {first_id}-{last_id}, "
+              f"{len(shards)} shards on {args.workers} workers")
+
+        ids, deltas, log_rows = [], {}, []
+        started = time.time()
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(args.workers, initializer=init_worker) as pool:
+            for done, (shard_ids, shard_deltas, shard_log) in enumerate(
+                    pool.imap_unordered(extract_shard, shards), 1):
+                ids.extend(shard_ids)
+                merge_deltas(deltas, shard_deltas)
+                log_rows.extend(shard_log)
+                elapsed = time.time() - started
+                rate = len(ids) / elapsed if elapsed else 0.0
+                eta = (total - len(ids)) / rate if rate else 0.0
+                print(f"[BACKFILL] {done}/{len(shards)} shards, {len(ids)}/{total} transcripts "
+                      f"({100.0 * len(ids) / total:.0f}%), {rate:.0f}/s, ETA {format_eta(eta)}")
+
+        cursor = conn.cursor()
+        old_counts = baseline if full else get_old_counts(cursor, ids)
+        cursor.close()
+        changed = sorted(
+            ((deltas.get(cs, [0])[0] - old_counts.get(cs, 0), cs) for cs in set(deltas) | set(old_counts)),
+            key=lambda x: -abs(x[0])
+        )
+        changed = [(diff, cs) for diff, cs in changed if diff]
+        print(f"[BACKFILL] {len(log_rows)} sightings of {len(deltas)} callsigns "
+              f"(was {sum(old_counts.values())} of {len(old_counts)}); {len(changed)} counts change")
+        for diff, cs in changed[:20]:
+            print(f"  {cs:<10} {diff:+d}")
+
+        if args.dry_run:
+            print("[BACKFILL] Dry run, nothing written.")
+            return
+        apply_backfill(conn, ids, deltas, log_rows, old_counts, full)
+        print(f"[BACKFILL] Done in {format_eta(time.time() - started)}.")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Compare callsign_extractor.extract_callsigns_smart with the window-loop
+version it replaced, on real transcripts.
+
+Transcripts come from the `transcriptions` table (DB_CONFIG in
+callsign_extractor.py), run through the same corrections and rejoin steps
+as process_transcript_entry, or from a text file with one transcript per
+line. Reports time per transcript for both extractors, and recall of the
+new scanner against the old candidates.
+
+Usage:
+  python3 callsign_benchmark.py [--limit 5000] [--repeat 3] [--file transcripts.txt]
+"""
+
+import re
+import time
+import string
+import argparse
+
+import callsign_extractor as ce
+from text_corrections import CorrectionsTrie
+
+def extract_callsigns_legacy(text):
+    """extract_callsigns_smart as it was before the scanner, for reference."""
+    words = text.lower().translate(str.maketrans('', '', string.punctuation)).split()
+    candidates = set()
+    pattern = r'^[A-Z]{1,2}\d[A-Z]{1,4}$'
+
+    for i in range(len(words)):
+
+        if re.fullmatch(pattern, words[i]):
+            candidates.add(words[i])
+
+        for window in range(2, 7):
+            chunk = words[i:i+window]
+            joined = ''.join(chunk).upper()
+            if re.fullmatch(pattern, joined):
+                candidates.add(joined)
+
+        for size in range(2, 7):
+            chunk = ''.join(words[i:i+size])
+            if any(c.isdigit() for c in chunk) and re.fullmatch(pattern, chunk):
+                candidates.add(chunk)
+
+    for word in words:
+        joined = word.upper()
+        if re.fullmatch(pattern, joined):
+            candidates.add(joined)
+
+    for i in range(len(words)-1):
+        joined = (words[i] + words[i+1]).upper()
+        if re.fullmatch(pattern, joined):
+            candidates.add(joined)
+
+    return list(candidates)
+
+def load_from_db(limit):
+    conn = ce.get_mysql_connection()
+    try:
+        corrections = ce.load_corrections(conn)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT transcription FROM transcriptions WHERE transcription IS NOT NULL "
+            "ORDER BY id DESC LIMIT %s", (limit,)
+        )
+        rows = [r[0] for r in cursor.fetchall()]
+        cursor.close()
+    finally:
+        conn.close()
+    return [ce.rejoin_potential_callsigns(ce.apply_corrections(t, corrections)) for t in rows]
+
+def load_from_file(path):
+    with open(path, encoding="utf-8", errors="ignore") as fh:
+        return [ce.rejoin_potential_callsigns(ce.apply_corrections(line, CorrectionsTrie())) for line in fh if line.strip()]
+
+def time_extractor(extract, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [extract(t) for t in texts]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the callsign scanner against the old extractor.")
+    parser.add_argument("--limit", type=int, default=5000, help="most recent transcripts to load from MySQL")
+    parser.add_argument("--file", help="read transcripts from a text file instead, one per line")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = load_from_file(args.file) if args.file else load_from_db(args.limit)
+    if not texts:
+        print("No transcripts to benchmark.")
+        return
+    words = sum(len(t.split()) for t in texts)
+    print(f"{len(texts)} transcripts, {words} words (best of {args.repeat})")
+
+    old_time, old_results = time_extractor(extract_callsigns_legacy, texts, args.repeat)
+    ce.word_transitions.cache_clear()
+    new_time, new_results = time_extractor(ce.extract_callsigns_smart, texts, args.repeat)
+
+    old_total = new_total = hits = 0
+    missed, extra = [], []
+    for text, old, new in zip(texts, old_results, new_results):
+        old, new = set(old), set(new)
+        old_total += len(old)
+        new_total += len(new)
+        hits += len(old & new)
+        if old - new:
+            missed.append((text, sorted(old - new)))
+        if new - old:
+            extra.append((text, sorted(new - old)))
+
+    print(f"  legacy   {old_time:8.3f}s  {1e6 * old_time / len(texts):9.1f} us/transcript  {old_total} candidates")
+    print(f"  scanner  {new_time:8.3f}s  {1e6 * new_time / len(texts):9.1f} us/transcript  {new_total} candidates")
+    print(f"  speedup  {old_time / new_time:.1f}x")
+    recall = 100.0 * hits / old_total if old_total else 100.0
+    print(f"  recall   {recall:.2f}% of legacy candidates, {len(extra)} transcripts with extra candidates")
+    for text, calls in missed[:10]:
+        print(f"  MISSED {calls}: {text[:120]}")
+    for text, calls in extra[:10]:
+        print(f"  EXTRA  {calls}: {text[:120]}")
+
+if __name__ == "__main__":
+    main()
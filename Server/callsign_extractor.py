@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 
-import re
 import mysql.connector
-import requests
 from datetime import datetime
 import time
+import signal
 import string
+import argparse
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from text_corrections import load_corrections_trie
+from uls_licenses import LicenseLookup
+from callsign_resolver import load_callsign_resolver
 
 # ----------------------------
 # Config
@@ -18,11 +25,20 @@ DB_CONFIG = {
     'database': 'DATABASE'
 }
 
-USE_QRZ_VALIDATION = False #Use QRZ XML API to validate Callsigns?
+USE_QRZ_VALIDATION = False #Use QRZ XML API to validate Callsigns? (run callsign_validator.py)
+USE_ULS_VALIDATION = True  # validate US callsigns against the FCC files imported by uls_licenses.py
+USE_FUZZY_RESOLVE = True  # map near-misses (KK7NQM) to a validated callsign one edit away
 QRZ_USERNAME = 'USERNAME'
 QRZ_PASSWORD = 'PASSWORD'
-QRZ_SESSION_KEY = None  # will be dynamically set
-currentID = 0
+FLUSH_EVERY = 200  # transcripts per write transaction
+UPSERT_CHUNK = 500  # callsigns per INSERT ... ON DUPLICATE KEY UPDATE
+VALIDATION_CACHE_SIZE = 100000  # callsigns kept in memory
+VALIDATION_CACHE_TTL = 3600  # seconds before a cached answer is re-read from MySQL
+FETCH_LIMIT = 900  # transcripts per page
+IDLE_SLEEP_MIN = 2  # daemon: first sleep when no new transcripts, doubles while idle
+IDLE_SLEEP_MAX = 60
+REFRESH_SEC = 300  # daemon: reload corrections/caches and re-scan for skipped ids this often
+VERBOSE = True  # per-callsign log lines (callsign_backfill.py turns these off)
 
 # ----------------------------
 # Database Helpers
@@ -31,139 +47,233 @@ currentID = 0
 def get_mysql_connection():
     return mysql.connector.connect(**DB_CONFIG)
 
-def load_corrections():
-    conn = get_mysql_connection()
+def load_corrections(conn):
     cursor = conn.cursor()
-    cursor.execute("SELECT `detect`, `correct` FROM corrections")
-    rows = cursor.fetchall()
+    corrections = load_corrections_trie(cursor)
     cursor.close()
-    conn.close()
-    return {d.strip().lower(): c.strip().lower() for d, c in rows}
+    return corrections
 
-def get_recent_transcripts(limit=900):
-    conn = get_mysql_connection()
+def get_recent_transcripts(conn, limit=None, after_id=0):
+    """Next page of unprocessed transcripts after `after_id` (keyset pagination)."""
     cursor = conn.cursor(dictionary=True)
     cursor.execute("""
-    SELECT * FROM transcriptions
-    WHERE processed = 0
+    SELECT id, filename, transcription FROM transcriptions
+    WHERE processed = 0 AND id > %s
     ORDER BY id ASC
-""")
+    LIMIT %s
+""", (after_id, limit or FETCH_LIMIT))
     rows = cursor.fetchall()
     cursor.close()
-    conn.close()
     return rows
 
+def get_first_unprocessed_id(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT MIN(id) FROM transcriptions WHERE processed = 0")
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row and row[0] is not None else None
+
 # ----------------------------
 # Callsign Insert/Update Logic
 # ----------------------------
 
-def insert_or_update_callsign(callsign, validated):
-    now = datetime.now()
-    conn = get_mysql_connection()
-    cursor = conn.cursor()
-
-    # Check for existing entry
-    cursor.execute("SELECT id FROM callsigns WHERE callsign = %s", (callsign,))
-    result = cursor.fetchone()
-    log_callsign_sighting(callsign, currentID)
-
-    if result:
-        # Update last_seen
-        cursor.execute(
-            """
-            UPDATE callsigns
-            SET last_seen = %s,
-                seen_count = seen_count + 1
-            WHERE callsign = %s
-            """,
-            (now, callsign)
-        )
-    else:
-        # Insert new
+def upsert_callsigns(cursor, deltas):
+    """
+    Write per-callsign deltas {callsign: [count, first_seen, last_seen,
+    validated]} as multi-row INSERT ... ON DUPLICATE KEY UPDATE statements.
+    Rows go in callsign order so concurrent writers lock them in the same
+    order.
+    """
+    rows = [(cs, d[3], d[1], d[2], d[0]) for cs, d in sorted(deltas.items())]
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        chunk = rows[i:i + UPSERT_CHUNK]
         cursor.execute(
-            """
-            INSERT INTO callsigns (callsign, validated, first_seen, last_seen)
-            VALUES (%s, %s, %s, %s)
+            f"""
+            INSERT INTO callsigns (callsign, validated, first_seen, last_seen, seen_count)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))}
+            ON DUPLICATE KEY UPDATE
+                validated = GREATEST(validated, VALUES(validated)),
+                first_seen = LEAST(first_seen, VALUES(first_seen)),
+                last_seen = GREATEST(last_seen, VALUES(last_seen)),
+                seen_count = seen_count + VALUES(seen_count)
             """,
-            (callsign, int(validated), now, now)
+            [value for row in chunk for value in row]
         )
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+def log_callsign_sightings(cursor, rows):
+    if rows:
+        cursor.executemany(
+            "INSERT INTO callsign_log (callsign, transcript_id) VALUES (%s, %s)",
+            rows
+        )
 
-# ----------------------------
-# QRZ Session Management
-# ----------------------------
+def mark_transcripts_processed(cursor, transcript_ids):
+    if transcript_ids:
+        cursor.execute(
+            f"UPDATE transcriptions SET processed = 1 WHERE id IN ({', '.join(['%s'] * len(transcript_ids))})",
+            list(transcript_ids)
+        )
 
-def get_qrz_session_key():
-    """
-    Log in to QRZ and return a valid session key.
+class CallsignWriter:
     """
-    url = f"https://xmldata.qrz.com/xml/current/?username={QRZ_USERNAME}&password={QRZ_PASSWORD}"
-    try:
-        response = requests.get(url, timeout=5)
-        if '<Session>' in response.text:
-            match = re.search(r'<Key>(.*?)</Key>', response.text)
-            if match:
-                print("[QRZ] New session key acquired.")
-                return match.group(1)
-        print("[QRZ] Failed to get session key. Response:", response.text)
-    except Exception as e:
-        print(f"[QRZ] Exception while getting session key: {e}")
-    return None
-
-def check_callsign_qrz(callsign, max_retries=2):
-    """
-    Validate a callsign via QRZ lookup with limited retries.
+    Buffers sightings and processed flags on one connection and writes them
+    in a single transaction every `flush_every` transcripts. Sightings are
+    folded into one delta per callsign so `callsigns` gets one row write
+    per callsign per flush.
     """
-    global QRZ_SESSION_KEY
-
-    for attempt in range(max_retries):
-        if not QRZ_SESSION_KEY:
-            QRZ_SESSION_KEY = get_qrz_session_key()
-            if not QRZ_SESSION_KEY:
-                print("[QRZ] Could not obtain session key.")
-                return False
 
-        url = f"https://xmldata.qrz.com/xml/current/?s={QRZ_SESSION_KEY}&callsign={callsign}"
+    def __init__(self, conn, flush_every=None):
+        self.conn = conn
+        self.flush_every = flush_every or FLUSH_EVERY
+        self.deltas = {}
+        self.log_rows = []
+        self.processed = []
+
+    def add_sighting(self, callsign, validated, transcript_id, seen_at=None):
+        seen_at = seen_at or datetime.now()
+        delta = self.deltas.get(callsign)
+        if delta is None:
+            self.deltas[callsign] = [1, seen_at, seen_at, int(validated)]
+        else:
+            delta[0] += 1
+            delta[1] = min(delta[1], seen_at)
+            delta[2] = max(delta[2], seen_at)
+            delta[3] = max(delta[3], int(validated))
+        self.log_rows.append((callsign, transcript_id))
+        validation_cache.record(callsign, validated)
+
+    def mark_processed(self, transcript_id):
+        self.processed.append(transcript_id)
+        if len(self.processed) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not (self.deltas or self.processed):
+            return
+        self.conn.ping(reconnect=True, attempts=3, delay=1)
+        cursor = self.conn.cursor()
         try:
-            r = requests.get(url, timeout=5)
-            if "<Session>" in r.text and "<Error>" in r.text:
-                print(f"[QRZ] Session expired. Attempt {attempt+1}/{max_retries}. Renewing...")
-                QRZ_SESSION_KEY = None  # force new session
-                continue
-            return callsign in r.text
-        except Exception as e:
-            print(f"[QRZ] Lookup error for {callsign}: {e}")
-            return False
-
-    print(f"[QRZ] Failed after {max_retries} retries for {callsign}.")
-    return False
+            upsert_callsigns(cursor, self.deltas)
+            log_callsign_sightings(cursor, self.log_rows)
+            mark_transcripts_processed(cursor, self.processed)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            # Cached answers for this batch were never written.
+            validation_cache.discard(self.deltas)
+            raise
+        finally:
+            cursor.close()
+        print(f"[DB] Wrote {len(self.log_rows)} sightings of {len(self.deltas)} callsigns "
+              f"for {len(self.processed)} transcripts.")
+        self.deltas = {}
+        self.log_rows = []
+        self.processed = []
 
+# ----------------------------
+# Validation Lookups
+# ----------------------------
 
+def is_callsign_validated_locally(conn, callsign):
+    return validation_cache.lookup(conn, callsign)
 
-def is_callsign_validated_locally(callsign):
-    conn = get_mysql_connection()
+def query_callsign_validated(conn, callsign):
     cursor = conn.cursor()
     cursor.execute("SELECT validated FROM callsigns WHERE callsign = %s", (callsign,))
     result = cursor.fetchone()
     cursor.close()
-    conn.close()
     if result and result[0] == 1:
         return True
     return False
+
+class ValidationCache:
+    """
+    Process-wide callsign -> validated map. preload() reads the whole
+    `callsigns` table (most recently seen first, up to max_size) so lookups
+    during a batch are answered from memory; while the preload is fresh and
+    nothing has been evicted, a callsign not in the map is known not to be
+    in the table either. Entries older than `ttl` seconds and misses after an
+    eviction fall back to one SELECT.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or VALIDATION_CACHE_SIZE
+        self.ttl = ttl or VALIDATION_CACHE_TTL
+        self.entries = OrderedDict()  # callsign -> (validated, stored_at)
+        self.loaded_at = None
+        self.complete = False
+        self.hits = 0
+        self.misses = 0
+
+    def preload(self, conn, force=False):
+        now = time.monotonic()
+        if not force and self.loaded_at is not None and now - self.loaded_at < self.ttl:
+            return
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT callsign, validated FROM callsigns ORDER BY last_seen DESC LIMIT %s",
+            (self.max_size + 1,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        self.entries.clear()
+        # Oldest first, so the most recently heard callsigns end up most recently used.
+        for callsign, validated in reversed(rows[:self.max_size]):
+            self.entries[callsign.upper()] = (validated == 1, now)
+        self.loaded_at = now
+        self.complete = len(rows) <= self.max_size
+        print(f"[CACHE] Preloaded {len(self.entries)} callsigns"
+              f"{'' if self.complete else ' (table larger than cache)'}.")
+
+    def get(self, callsign):
+        """Cached answer, or None when MySQL has to be asked."""
+        now = time.monotonic()
+        entry = self.entries.get(callsign)
+        if entry is not None and now - entry[1] < self.ttl:
+            self.entries.move_to_end(callsign)
+            return entry[0]
+        if entry is None and self.complete and now - self.loaded_at < self.ttl:
+            return False
+        return None
+
+    def lookup(self, conn, callsign):
+        validated = self.get(callsign)
+        if validated is not None:
+            self.hits += 1
+            return validated
+        self.misses += 1
+        validated = query_callsign_validated(conn, callsign)
+        self.store(callsign, validated)
+        return validated
+
+    def store(self, callsign, validated):
+        self.entries[callsign] = (bool(validated), time.monotonic())
+        self.entries.move_to_end(callsign)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.complete = False
+
+    def record(self, callsign, validated):
+        """A sighting queued for writing; validated never goes back to 0."""
+        entry = self.entries.get(callsign)
+        self.store(callsign, validated or (entry is not None and entry[0]))
+
+    def discard(self, callsigns):
+        for callsign in callsigns:
+            self.entries.pop(callsign, None)
+        # Dropped entries are unknown again, not "not in the table".
+        self.complete = False
+
+validation_cache = ValidationCache()
+license_lookup = None  # LicenseLookup, opened per batch when USE_ULS_VALIDATION is on
+callsign_resolver = None  # CallsignResolver over validated callsigns, when USE_FUZZY_RESOLVE is on
+
 # ----------------------------
 # Text & Callsign Processing
 # ----------------------------
 
-def apply_corrections(transcript, correction_map):
-    words = transcript.lower().split()
-    corrected = []
-    for word in words:
-        cleaned = word.translate(str.maketrans('', '', string.punctuation))
-        corrected.append(correction_map.get(cleaned, cleaned))
-    return ' '.join(corrected)
+def apply_corrections(transcript, corrections):
+    return corrections.apply(transcript)
 
 def rejoin_potential_callsigns(corrected_text):
     words = corrected_text.split()
@@ -185,52 +295,60 @@ def rejoin_potential_callsigns(corrected_text):
 
     return ' '.join(rejoined)
 
+# Callsign grammar: 1-2 letters, one digit, 1-4 letters (K7NQN, KK7NQN).
+# Scanner states: 0 start, 1-2 prefix letters, 3 digit, 4-7 suffix letters.
+MAX_CALLSIGN_WORDS = 6
+SCAN_DEAD = -1
+SCAN_ACCEPT = 4
+SCAN_ON_LETTER = (1, 2, SCAN_DEAD, 4, 5, 6, 7, SCAN_DEAD)
+SCAN_ON_DIGIT = (SCAN_DEAD, 3, 3, SCAN_DEAD, SCAN_DEAD, SCAN_DEAD, SCAN_DEAD, SCAN_DEAD)
+
+@lru_cache(maxsize=65536)
+def word_transitions(word):
+    """State reached from each scanner state after reading all of `word`."""
+    moves = []
+    for state in range(len(SCAN_ON_LETTER)):
+        for ch in word:
+            if "A" <= ch <= "Z":
+                state = SCAN_ON_LETTER[state]
+            elif ch.isdecimal():
+                state = SCAN_ON_DIGIT[state]
+            else:
+                state = SCAN_DEAD
+            if state == SCAN_DEAD:
+                break
+        moves.append(state)
+    return tuple(moves)
+
+def scan_callsigns(words):
+    """
+    Single pass over upper-case tokens. Every partial match still alive is
+    advanced one whole word at a time, so a callsign spoken across up to
+    MAX_CALLSIGN_WORDS tokens ("k k 7 n q n") is found as well as one
+    written as a single word. Returns candidates in order of appearance.
+    """
+    found = {}
+    live = []
+    for i, word in enumerate(words):
+        moves = word_transitions(word)
+        live.append((i, 0))
+        still_live = []
+        for start, state in live:
+            state = moves[state]
+            if state == SCAN_DEAD or i - start >= MAX_CALLSIGN_WORDS:
+                continue
+            if state >= SCAN_ACCEPT:
+                found.setdefault("".join(words[start:i + 1]), None)
+            still_live.append((start, state))
+        live = still_live
+    return list(found)
+
 def extract_callsigns_smart(text):
     words = text.lower().translate(str.maketrans('', '', string.punctuation)).split()
-    candidates = set()
-    #pattern = r'^[A-Z]{1,2}\d{1,2}[A-Z]{1,4}$'
-    pattern = r'^[A-Z]{1,2}\d[A-Z]{1,4}$'
-
-    for i in range(len(words)):
-    
-        if re.fullmatch(pattern, words[i]):
-            candidates.add(words[i])
-    
-        for window in range(2, 7):
-            chunk = words[i:i+window]
-            joined = ''.join(chunk).upper()
-            if re.fullmatch(pattern, joined):
-                candidates.add(joined)
-                
-        for size in range(2, 7):
-            chunk = ''.join(words[i:i+size])
-            if any(c.isdigit() for c in chunk) and re.fullmatch(pattern, chunk):
-                candidates.add(chunk)
+    return scan_callsigns([w.upper() for w in words])
 
-    for word in words:
-        joined = word.upper()
-        if re.fullmatch(pattern, joined):
-            candidates.add(joined)
-
-    for i in range(len(words)-1):
-        joined = (words[i] + words[i+1]).upper()
-        if re.fullmatch(pattern, joined):
-            candidates.add(joined)
-
-    return list(candidates)
-
-def mark_transcript_processed(transcript_id):
-    global currentID
-    currentID = transcript_id
-    conn = get_mysql_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE transcriptions SET processed = 1 WHERE id = %s", (transcript_id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-def process_transcript_entry(entry, correction_map):
-    corrected = apply_corrections(entry['transcription'], correction_map)
+def process_transcript_entry(entry, correction_map, writer):
+    corrected = apply_corrections(entry['transcription'] or "", correction_map)
     rejoined = rejoin_potential_callsigns(corrected)
     raw_callsigns = extract_callsigns_smart(rejoined)
 
@@ -238,16 +356,25 @@ def process_transcript_entry(entry, correction_map):
     for cs in raw_callsigns:
         cs_upper = cs.upper()
 
-        if is_callsign_validated_locally(cs_upper):
+        # Unknown callsigns go in unvalidated; callsign_validator.py checks them against QRZ.
+        validated = 0
+        if is_callsign_validated_locally(writer.conn, cs_upper):
             validated = 1
-            print(f"[CACHE HIT] {cs_upper} already validated in DB, skipping QRZ")
-        elif USE_QRZ_VALIDATION:
-            validated = 1 if check_callsign_qrz(cs_upper) else 0
-            print(f"[QRZ LOOKUP] {cs_upper} → {'VALID' if validated else 'NOT FOUND'}")
         else:
-            validated = 0
-
-        insert_or_update_callsign(cs_upper, validated)
+            licensed = license_lookup.check(cs_upper) if license_lookup is not None else None
+            if licensed:
+                validated = 1
+            elif callsign_resolver is not None:
+                match = callsign_resolver.nearest(cs_upper)
+                if match:
+                    if VERBOSE:
+                        print(f"[FUZZY] {cs_upper} → {match[0]} (cost {match[1]:.1f})")
+                    cs_upper, validated = match[0], 1
+
+        # A near-miss and the real call in one transcript count once.
+        if any(cs_upper == seen for seen, _ in results):
+            continue
+        writer.add_sighting(cs_upper, validated, entry['id'], entry.get('timestamp'))
         results.append((cs_upper, validated))
 
     return {
@@ -258,42 +385,131 @@ def process_transcript_entry(entry, correction_map):
         'callsigns': results
     }
 
-def log_callsign_sighting(callsign, transcript_id):
-    conn = get_mysql_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO callsign_log (callsign, transcript_id) VALUES (%s, %s)",
-        (callsign, transcript_id)
-    )
-    conn.commit()
-    cursor.close()
-    conn.close()
-
 # ----------------------------
 # Batch Runner
 # ----------------------------
 
-def run_batch():
-    print("\n[🔎] Callsign Extractor + Logger\n")
-    corrections = load_corrections()
-    transcripts = get_recent_transcripts(limit=900)
-
+def prepare_run(conn):
+    """Load corrections and refresh the validation sources; returns the corrections."""
+    global license_lookup, callsign_resolver
+    corrections = load_corrections(conn)
+    validation_cache.preload(conn)
+    if USE_ULS_VALIDATION:
+        license_lookup = LicenseLookup()
+        if not license_lookup.available:
+            license_lookup = None
+    if USE_FUZZY_RESOLVE:
+        cursor = conn.cursor()
+        callsign_resolver = load_callsign_resolver(cursor)
+        cursor.close()
+    return corrections
+
+def process_new_transcripts(conn, corrections, writer, last_id, limit=None):
+    """Process one page after `last_id`; returns (rows processed, new last_id)."""
+    transcripts = get_recent_transcripts(conn, limit=limit, after_id=last_id)
     for row in transcripts:
-        result = process_transcript_entry(row, corrections)
-        mark_transcript_processed(row['id'])
+        result = process_transcript_entry(row, corrections, writer)
+        writer.mark_processed(row['id'])
+        last_id = row['id']
         print(f" File: {result['filename']} (ID: {result['id']})")
         print(f" Corrected: {result['corrected_text']}")
         for cs, valid in result['callsigns']:
             print(f" {cs} → {'VALID' if valid else 'UNVERIFIED'}")
         print("-" * 50)
+    return len(transcripts), last_id
+
+def run_batch():
+    print("\n[🔎] Callsign Extractor + Logger\n")
+    conn = get_mysql_connection()
+    try:
+        corrections = prepare_run(conn)
+        writer = CallsignWriter(conn)
+        last_id = 0
+        while True:
+            count, last_id = process_new_transcripts(conn, corrections, writer, last_id)
+            if count < FETCH_LIMIT:
+                break
+
+        writer.flush()
+        print(f"[CACHE] {validation_cache.hits} validation lookups from memory, "
+              f"{validation_cache.misses} from MySQL.")
+    finally:
+        conn.close()
 
 # ----------------------------
-# Run Once
+# Daemon Mode
+# ----------------------------
+
+def run_daemon():
+    """
+    Poll for new transcripts until SIGTERM/SIGINT. Only rows after the last
+    processed id are fetched, so an idle poll is one index range read. Every
+    REFRESH_SEC the corrections and validation sources are reloaded and the
+    high-water mark is reset to the oldest unprocessed row, which picks up
+    ids committed out of order.
+    """
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"[DAEMON] Signal {signum} received, finishing current page...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    print("\n[🔎] Callsign Extractor + Logger (daemon)\n")
+    conn = get_mysql_connection()
+    writer = CallsignWriter(conn)
+    corrections = None
+    refreshed_at = 0
+    last_id = 0
+    idle = IDLE_SLEEP_MIN
+    try:
+        while not stop.is_set():
+            try:
+                conn.ping(reconnect=True, attempts=3, delay=1)
+                if corrections is None or time.monotonic() - refreshed_at >= REFRESH_SEC:
+                    corrections = prepare_run(conn)
+                    first = get_first_unprocessed_id(conn)
+                    last_id = min(last_id, first - 1) if first is not None else last_id
+                    refreshed_at = time.monotonic()
+
+                count, last_id = process_new_transcripts(conn, corrections, writer, last_id)
+                writer.flush()
+            except mysql.connector.Error as e:
+                print(f"[DAEMON] Database error: {e}; retrying in {IDLE_SLEEP_MAX}s")
+                # Nothing from the failed page was committed; start it again from the table.
+                validation_cache.discard(writer.deltas)
+                writer = CallsignWriter(conn)
+                corrections = None
+                stop.wait(IDLE_SLEEP_MAX)
+                continue
+
+            if count >= FETCH_LIMIT:
+                idle = IDLE_SLEEP_MIN
+                continue  # more waiting, no sleep
+            if count:
+                idle = IDLE_SLEEP_MIN
+                stop.wait(idle)
+            else:
+                stop.wait(idle)
+                idle = min(idle * 2, IDLE_SLEEP_MAX)
+    finally:
+        try:
+            writer.flush()
+        finally:
+            conn.close()
+        print("[DAEMON] Stopped.")
+
+# ----------------------------
+# Entry Point
 # ----------------------------
 
 if __name__ == '__main__':
-    run_batch()
-    # For looped use:
-    # while True:
-    #     run_batch()
-    #     time.sleep(60)
+    parser = argparse.ArgumentParser(description="Extract and log callsigns from new transcripts.")
+    parser.add_argument("--daemon", action="store_true", help="keep polling for new transcripts until SIGTERM")
+    args = parser.parse_args()
+    if args.daemon:
+        run_daemon()
+    else:
+        run_batch()
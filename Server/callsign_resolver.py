@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Map a misheard callsign to the nearest validated one.
+
+Whisper often gets one character of a callsign wrong (KK7NQM for KK7NQN),
+and every such miss used to become a new row in `callsigns`. The resolver
+indexes validated callsigns by their single-character deletes (SymSpell),
+so the known callsigns within one edit of a candidate are found with a
+handful of dict lookups instead of a scan of the table.
+
+Edits are weighted by how easily the two characters are confused when
+spelled out over the air: swapping letters that rhyme ("B"/"D"/"P"/"T"...,
+"M"/"N", "F"/"S"/"X") costs CONFUSABLE_COST, any other single edit costs
+1, and only matches within MAX_COST are taken. The cheapest match wins; a
+tie is only broken when one callsign has been heard far more often than
+the other, otherwise the candidate is left alone.
+
+Used by callsign_extractor.py and AI_Scripts/Transcript_Analyzer.py.
+load_callsign_resolver() keeps one index per process and rebuilds it only
+when the set of validated callsigns changes.
+"""
+
+from table_cache import load_cached
+
+CONFUSABLE_COST = 0.5
+# Accept matches up to this weighted edit cost. The default only takes
+# sound-alike substitutions; 1.0 also accepts any single insert, delete or
+# swap, which merges genuinely different short calls (K7NQN / KK7NQN).
+MAX_COST = CONFUSABLE_COST
+TIE_RATIO = 3.0  # on equal cost, the more-heard callsign must be this many times more common
+
+# Letters and digits that sound alike when spoken.
+CONFUSABLE_GROUPS = ("BCDEGPTVZ", "MN", "FSX", "AJK", "IY", "QU", "59")
+_CONFUSABLE = {
+    (a, b) for group in CONFUSABLE_GROUPS for a in group for b in group if a != b
+}
+
+FINGERPRINT_SQL = (
+    "SELECT COUNT(*), COALESCE(SUM(CRC32(callsign)), 0) FROM callsigns WHERE validated = 1"
+)
+LOAD_SQL = "SELECT callsign, seen_count FROM callsigns WHERE validated = 1"
+
+def _deletes(word):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+def edit_cost(a, b):
+    """Weighted cost of the single edit turning a into b, or None if it takes more than one."""
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            i = diffs[0]
+            return CONFUSABLE_COST if (a[i], b[i]) in _CONFUSABLE else 1.0
+        if len(diffs) == 2 and diffs[1] == diffs[0] + 1 and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]:
+            return 1.0  # adjacent transposition
+        return None
+    short, long_ = (a, b) if len(a) < len(b) else (b, a)
+    if len(long_) - len(short) != 1:
+        return None
+    for i in range(len(long_)):
+        if long_[:i] + long_[i + 1:] == short:
+            return 1.0
+    return None
+
+class CallsignResolver:
+
+    def __init__(self, known=()):
+        self.counts = {}
+        self.index = {}
+        self.memo = {}
+        for callsign, seen_count in known:
+            self.add(callsign, seen_count)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, callsign, seen_count=1):
+        callsign = callsign.upper()
+        self.counts[callsign] = max(self.counts.get(callsign, 0), seen_count or 1)
+        for key in _deletes(callsign) | {callsign}:
+            self.index.setdefault(key, set()).add(callsign)
+        self.memo.clear()
+
+    def nearest(self, callsign):
+        """Return (known_callsign, cost) for the best match within MAX_COST, or None."""
+        callsign = callsign.upper()
+        if callsign in self.counts:
+            return callsign, 0.0
+        if callsign in self.memo:
+            return self.memo[callsign]
+
+        matches = set()
+        for key in _deletes(callsign) | {callsign}:
+            matches |= self.index.get(key, set())
+        scored = []
+        for known in matches:
+            cost = edit_cost(callsign, known)
+            if cost is not None and cost <= MAX_COST:
+                scored.append((cost, -self.counts[known], known))
+        scored.sort()
+
+        best = None
+        if scored:
+            cost, neg_count, known = scored[0]
+            runner_up = scored[1] if len(scored) > 1 else None
+            if runner_up is None or runner_up[0] > cost or -neg_count >= TIE_RATIO * -runner_up[1]:
+                best = (known, cost)
+        self.memo[callsign] = best
+        return best
+
+    def resolve(self, callsign):
+        """Nearest known callsign, or `callsign` itself when there is no confident match."""
+        match = self.nearest(callsign)
+        return match[0] if match else callsign.upper()
+
+def load_callsign_resolver(cursor):
+    """Resolver over the validated callsigns in `callsigns`, cached per process."""
+    return load_cached(cursor, FINGERPRINT_SQL, LOAD_SQL, CallsignResolver)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+QRZ validation worker for callsigns found by callsign_extractor.py.
+
+The extractor never talks to QRZ; it stores every candidate with
+validated = 0. This worker picks up unvalidated callsigns in batches
+(most frequently heard first), looks them up concurrently under a shared
+rate limit and one shared session key, and records every answer in
+`callsign_qrz_checks`:
+
+  valid      -> callsigns.validated = 1, never checked again
+  not_found  -> re-checked after QRZ_RECHECK_DAYS (new licences do appear)
+  error      -> retried after QRZ_ERROR_RETRY_MIN, doubling per attempt
+
+so a misheard callsign costs one lookup per re-check interval instead of
+one per sighting. Once uls_licenses.py has imported the FCC files, US
+callsigns are answered from that local copy and only non-US calls go to
+QRZ; with USE_QRZ_VALIDATION off, only the local check runs.
+
+Usage:
+  python3 callsign_validator.py           # one pass over everything due
+  python3 callsign_validator.py --loop    # keep running, sleeping between passes
+"""
+
+import re
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from callsign_extractor import (
+    USE_QRZ_VALIDATION, QRZ_USERNAME, QRZ_PASSWORD, get_mysql_connection
+)
+from uls_licenses import LicenseLookup
+
+# ----------------------------
+# Config
+# ----------------------------
+
+QRZ_URL = "https://xmldata.qrz.com/xml/current/"
+QRZ_WORKERS = 4  # concurrent lookups
+QRZ_RATE = 2.0  # lookups per second across all workers
+QRZ_TIMEOUT = 5  # seconds per HTTP request
+QRZ_BATCH = 200  # callsigns per pass
+QRZ_RECHECK_DAYS = 30  # before a not-found callsign is looked up again
+QRZ_ERROR_RETRY_MIN = 15  # first retry after a failed lookup, doubles per attempt
+QRZ_ERROR_RETRY_MAX_MIN = 24 * 60
+LOOP_SLEEP = 60  # seconds between passes with --loop
+
+# ----------------------------
+# QRZ Client
+# ----------------------------
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class QRZClient:
+    """
+    Thread-safe QRZ XML lookups sharing one session key. When a key
+    expires only the first thread to notice logs in again; the others pick
+    up the new key.
+    """
+
+    def __init__(self, username, password, rate=None):
+        self.username = username
+        self.password = password
+        self.http = requests.Session()
+        self.limiter = RateLimiter(rate or QRZ_RATE)
+        self.session_key = None
+        self.lock = threading.Lock()
+
+    def _get(self, params):
+        self.limiter.wait()
+        return self.http.get(QRZ_URL, params=params, timeout=QRZ_TIMEOUT).text
+
+    def get_session_key(self):
+        with self.lock:
+            if self.session_key:
+                return self.session_key
+            try:
+                text = self._get({"username": self.username, "password": self.password})
+                match = re.search(r"<Key>(.*?)</Key>", text)
+                if match:
+                    print("[QRZ] New session key acquired.")
+                    self.session_key = match.group(1)
+                else:
+                    print("[QRZ] Failed to get session key. Response:", text)
+            except Exception as e:
+                print(f"[QRZ] Exception while getting session key: {e}")
+            return self.session_key
+
+    def drop_session_key(self, key):
+        with self.lock:
+            if self.session_key == key:
+                self.session_key = None
+
+    def lookup(self, callsign, max_retries=2):
+        """Return 'valid', 'not_found' or 'error'."""
+        for attempt in range(max_retries):
+            key = self.get_session_key()
+            if not key:
+                return "error"
+            try:
+                text = self._get({"s": key, "callsign": callsign})
+            except Exception as e:
+                print(f"[QRZ] Lookup error for {callsign}: {e}")
+                return "error"
+
+            call = re.search(r"<call>(.*?)</call>", text, re.IGNORECASE)
+            if call:
+                return "valid" if call.group(1).strip().upper() == callsign else "not_found"
+            error = re.search(r"<Error>(.*?)</Error>", text, re.IGNORECASE | re.DOTALL)
+            message = error.group(1) if error else ""
+            if "not found" in message.lower():
+                return "not_found"
+            if "session" in message.lower():
+                print(f"[QRZ] Session expired. Attempt {attempt+1}/{max_retries}. Renewing...")
+                self.drop_session_key(key)
+                continue
+            print(f"[QRZ] Unexpected response for {callsign}: {message or text[:200]}")
+            return "error"
+
+        print(f"[QRZ] Failed after {max_retries} retries for {callsign}.")
+        return "error"
+
+# ----------------------------
+# Database Helpers
+# ----------------------------
+
+def get_due_callsigns(conn, limit=None, offset=0):
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT c.callsign, COALESCE(q.attempts, 0)
+        FROM callsigns c
+        LEFT JOIN callsign_qrz_checks q ON q.callsign = c.callsign
+        WHERE c.validated = 0
+          AND (q.next_check IS NULL OR q.next_check <= NOW())
+        ORDER BY c.seen_count DESC
+        LIMIT %s OFFSET %s
+    """, (limit or QRZ_BATCH, offset))
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+def retry_minutes(status, attempts):
+    if status != "error":
+        return QRZ_RECHECK_DAYS * 24 * 60
+    return min(QRZ_ERROR_RETRY_MIN * 2 ** max(attempts - 1, 0), QRZ_ERROR_RETRY_MAX_MIN)
+
+def save_results(conn, results):
+    """results: [(callsign, status, attempts)] for this pass, written in one transaction."""
+    conn.ping(reconnect=True, attempts=3, delay=1)
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            INSERT INTO callsign_qrz_checks (callsign, status, checked_at, next_check, attempts)
+            VALUES (%s, %s, NOW(), NOW() + INTERVAL %s MINUTE, %s)
+            ON DUPLICATE KEY UPDATE
+                status = VALUES(status),
+                checked_at = VALUES(checked_at),
+                next_check = VALUES(next_check),
+                attempts = VALUES(attempts)
+        """, [
+            (cs, status, retry_minutes(status, attempts), attempts)
+            for cs, status, attempts in results
+        ])
+        valid = [cs for cs, status, _ in results if status == "valid"]
+        if valid:
+            cursor.execute(
+                f"UPDATE callsigns SET validated = 1 WHERE callsign IN ({', '.join(['%s'] * len(valid))})",
+                valid
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+# ----------------------------
+# Validation Runner
+# ----------------------------
+
+def validate_pending(conn, client, licenses=None, workers=None):
+    """
+    One pass: check every due callsign (in QRZ_BATCH chunks), US calls
+    against `licenses` when it has data, the rest against QRZ when `client`
+    is set. Returns counts by status.
+    """
+    counts = {"valid": 0, "not_found": 0, "error": 0}
+    skipped = 0  # due but nothing to check them with; stay due
+    with ThreadPoolExecutor(max_workers=workers or QRZ_WORKERS) as pool:
+        while True:
+            due = get_due_callsigns(conn, offset=skipped)
+            if not due:
+                break
+            statuses = {}
+            if licenses is not None and licenses.available:
+                for cs, _ in due:
+                    licensed = licenses.check(cs)
+                    if licensed is not None:
+                        statuses[cs] = "valid" if licensed else "not_found"
+            remote = [cs for cs, _ in due if cs not in statuses]
+            if client is not None:
+                statuses.update(zip(remote, pool.map(client.lookup, remote)))
+            else:
+                skipped += len(remote)
+
+            results = []
+            for cs, attempts in due:
+                status = statuses.get(cs)
+                if status is None:
+                    continue
+                # attempts counts consecutive failures; any answer resets it.
+                results.append((cs, status, attempts + 1 if status == "error" else 1))
+                counts[status] += 1
+                print(f"[{'QRZ' if cs in remote else 'ULS'} LOOKUP] {cs} → {status.upper()}")
+            if results:
+                save_results(conn, results)
+            if len(due) < QRZ_BATCH:
+                break
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate extracted callsigns against QRZ.")
+    parser.add_argument("--loop", action="store_true", help="keep running, sleeping between passes")
+    parser.add_argument("--sleep", type=int, default=LOOP_SLEEP, help="seconds between passes with --loop")
+    args = parser.parse_args()
+
+    client = QRZClient(QRZ_USERNAME, QRZ_PASSWORD) if USE_QRZ_VALIDATION else None
+    while True:
+        licenses = LicenseLookup()  # reopened each pass to pick up new imports
+        if client is None and not licenses.available:
+            print("[QRZ] USE_QRZ_VALIDATION is off and no ULS data is imported; nothing to do.")
+            return
+        conn = get_mysql_connection()
+        try:
+            started = time.time()
+            counts = validate_pending(conn, client, licenses)
+            print(f"[QRZ] {counts['valid']} valid, {counts['not_found']} not found, "
+                  f"{counts['error']} errors in {time.time() - started:.1f}s")
+        finally:
+            conn.close()
+        if not args.loop:
+            break
+        time.sleep(args.sleep)
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,424 @@
 import os
 import subprocess
 import datetime
-import schedule
 import time
+import re
+import glob
+import json
+import zlib
 import shutil
+import struct
+import zipfile
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-# Paths
-processed_dir = "DIRECTORY_PATH/processed"
-archive_dir = "DIRECTORY_PATH/archive"
+try:
+    import mysql.connector
+except ImportError:
+    mysql = None
+
+# Paths (same TRANSCRIBE_DIR layout as transcribe_watcher.py)
+BASE_DIR = os.getenv("TRANSCRIBE_DIR", "DIRECTORY_PATH")
+processed_dir = os.path.join(BASE_DIR, "processed")
+archive_dir = os.path.join(BASE_DIR, "archive")
+
+# Transcoding runs beside Whisper, so it gets a bounded pool at low priority.
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+TRANSCODE_NICE = int(os.getenv("TRANSCODE_NICE", "10"))  # 0-19, higher yields more CPU to Whisper
+TRANSCODE_IONICE = os.getenv("TRANSCODE_IONICE", "3")  # ionice class: 3 idle, 2 best-effort, "" off
+TRANSCODE_CPUS = os.getenv("TRANSCODE_CPUS", "")  # e.g. "2,3" to keep ffmpeg off Whisper's cores
+
+# Day archives: "zip" (stored, indexed, one clip readable with a single seek) or "7z" (solid, legacy)
+ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT", "zip")
+ARCHIVE_DB = os.getenv("ARCHIVE_DB", "mysql")  # "none" to skip the audio_archive_index table
+# "rolling": append clips to the day's zip through the day; "daily": all at once when sealing
+ARCHIVE_MODE = os.getenv("ARCHIVE_MODE", "rolling")
+ROLL_EVERY_MIN = int(os.getenv("ROLL_EVERY_MIN", "5"))
+ROLL_CHUNK = int(os.getenv("ROLL_CHUNK", "50"))  # clips appended per rolling pass
+DAY_FOLDER_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+DB_CONFIG = {
+    'host': 'HOSTNAME / IP',
+    'user': 'USER',
+    'password': 'PASSWORD',
+    'database': 'DATABASE'
+}
 
 # Ensure archive directory exists
 os.makedirs(archive_dir, exist_ok=True)
 
+def priority_prefix():
+    """nice/ionice/taskset wrapper for each ffmpeg, skipping tools that are not installed."""
+    prefix = []
+    if TRANSCODE_CPUS and shutil.which("taskset"):
+        prefix += ["taskset", "-c", TRANSCODE_CPUS]
+    if TRANSCODE_IONICE and shutil.which("ionice"):
+        prefix += ["ionice", "-c", TRANSCODE_IONICE] + (["-n", "7"] if TRANSCODE_IONICE == "2" else [])
+    if TRANSCODE_NICE and shutil.which("nice"):
+        prefix += ["nice", "-n", str(TRANSCODE_NICE)]
+    return prefix
+
+def convert_file(wav_path, mp3_path, prefix=()):
+    """
+    Convert one WAV. The MP3 is written to a .part file and renamed into
+    place only when ffmpeg succeeds, and the WAV is removed only after
+    that, so an interrupted run leaves either the WAV or a complete MP3.
+    Returns True when the WAV has been archived.
+    """
+    if os.path.exists(mp3_path):
+        # Finished on an earlier pass that stopped before removing the WAV.
+        os.remove(wav_path)
+        return True
+
+    part_path = mp3_path + ".part"
+    # Convert to MP3 at 32 kbps mono
+    result = subprocess.run(list(prefix) + [
+        "ffmpeg", "-y", "-nostdin", "-threads", "1", "-i", wav_path,
+        "-ac", "1", "-codec:a", "libmp3lame", "-b:a", "32k", "-f", "mp3", part_path
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    if result.returncode != 0 or not os.path.exists(part_path) or os.path.getsize(part_path) == 0:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        print(f"[TRANSCODE] ffmpeg failed for {wav_path} (exit {result.returncode}); will retry.")
+        return False
+
+    os.replace(part_path, mp3_path)
+    # Remove original WAV after conversion
+    os.remove(wav_path)
+    return True
+
 def convert_and_move():
     today_folder = os.path.join(archive_dir, datetime.date.today().strftime("%Y-%m-%d"))
     os.makedirs(today_folder, exist_ok=True)
 
-    for filename in os.listdir(processed_dir):
+    jobs = []
+    for filename in sorted(os.listdir(processed_dir)):
         if filename.lower().endswith(".wav"):
             wav_path = os.path.join(processed_dir, filename)
             mp3_filename = os.path.splitext(filename)[0] + ".mp3"
-            mp3_path = os.path.join(today_folder, mp3_filename)
+            jobs.append((filename, wav_path, os.path.join(today_folder, mp3_filename)))
+    if not jobs:
+        return
+
+    prefix = priority_prefix()
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS) as pool:
+        futures = [(filename, mp3_path, pool.submit(convert_file, wav_path, mp3_path, prefix))
+                   for filename, wav_path, mp3_path in jobs]
+        converted = 0
+        for filename, mp3_path, future in futures:
+            try:
+                ok = future.result()
+            except OSError as e:
+                print(f"[TRANSCODE] {filename}: {e}")
+                continue
+            if ok:
+                converted += 1
+                print(f"Converted and moved: {filename} -> {mp3_path}")
+
+    elapsed = time.time() - started
+    print(f"[TRANSCODE] {converted}/{len(jobs)} files in {elapsed:.1f}s "
+          f"({converted / elapsed if elapsed else 0:.1f} files/s, {TRANSCODE_WORKERS} workers)")
+
+# ----------------------------
+# Day Archives
+# ----------------------------
+
+def get_mysql_connection():
+    """Connection for audio_archive_index, or None when it is disabled or unreachable."""
+    if ARCHIVE_DB == "none" or mysql is None:
+        return None
+    try:
+        return mysql.connector.connect(**DB_CONFIG)
+    except mysql.connector.Error as e:
+        print(f"[ARCHIVE] Cannot reach the index database: {e}")
+        return None
+
+def clip_filename(member):
+    """transcriptions.filename for an archived MP3 (the WAV it was made from)."""
+    return os.path.splitext(os.path.basename(member))[0] + ".wav"
+
+def zip_member_offsets(zip_path):
+    """[(member, data_offset, length)] for every stored member of a zip."""
+    entries = []
+    with open(zip_path, "rb") as fh, zipfile.ZipFile(fh) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or info.compress_type != zipfile.ZIP_STORED:
+                continue
+            fh.seek(info.header_offset)
+            header = fh.read(30)
+            name_len, extra_len = struct.unpack("<HH", header[26:30])
+            entries.append((info.filename, info.header_offset + 30 + name_len + extra_len, info.compress_size))
+    return entries
+
+def index_entries(conn, zip_path, entries, replace=False):
+    """
+    Write audio_archive_index rows for [(member, data_offset, length)] of
+    one day archive. With replace=True the archive's other rows are dropped
+    in the same transaction, for a zip that was rewritten. Returns False
+    when they could not be written; the archive itself is complete either
+    way, only lookups fall back to a scan.
+    """
+    if not entries or ARCHIVE_DB == "none" or mysql is None:
+        return True
+    if conn is None:
+        return False
+    archive_file = os.path.relpath(zip_path, archive_dir)
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        if replace:
+            cursor.execute("DELETE FROM audio_archive_index WHERE archive_file = %s", (archive_file,))
+        cursor.executemany("""
+            INSERT INTO audio_archive_index (filename, archive_file, member, data_offset, data_length)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                archive_file = VALUES(archive_file),
+                member = VALUES(member),
+                data_offset = VALUES(data_offset),
+                data_length = VALUES(data_length)
+        """, [(clip_filename(m), archive_file, m, offset, length) for m, offset, length in entries])
+        conn.commit()
+        return True
+    except mysql.connector.Error as e:
+        print(f"[ARCHIVE] Indexing {zip_path} failed: {e}")
+        try:
+            conn.rollback()
+        except mysql.connector.Error:
+            pass
+        return False
+    finally:
+        if cursor is not None:
+            cursor.close()
+
+def index_or_mark(conn, zip_path, entries, replace=False):
+    """Index entries, or leave <day>.zip.reindex so reindex_pending() retries from the manifest."""
+    marker = zip_path + ".reindex"
+    if index_entries(conn, zip_path, entries, replace):
+        return True
+    with open(marker, "w"):
+        pass
+    return False
 
-            # Convert to MP3 at 32 kbps mono
-            subprocess.run([
-                "ffmpeg", "-y", "-i", wav_path,
-                "-ac", "1", "-codec:a", "libmp3lame", "-b:a", "32k", mp3_path
-            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+def reindex_pending(conn):
+    """Re-index every day zip whose index write failed earlier; its manifest replaces its rows."""
+    for marker in sorted(glob.glob(os.path.join(archive_dir, "*.zip.reindex"))):
+        zip_path = marker[:-len(".reindex")]
+        entries = [(member, e["offset"], e["length"])
+                   for member, e in read_manifest(zip_path + ".manifest").items()]
+        if not os.path.exists(zip_path):
+            os.remove(marker)
+        elif index_entries(conn, zip_path, entries, replace=True):
+            os.remove(marker)
+            print(f"[ARCHIVE] Re-indexed {zip_path} ({len(entries)} clips).")
 
-            # Remove original WAV after conversion
-            os.remove(wav_path)
-            print(f"Converted and moved: {filename} -> {mp3_path}")
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def read_manifest(manifest_path):
+    """{member: entry} from a day manifest; later lines win, a torn last line is ignored."""
+    entries = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry["member"]] = entry
+    return entries
+
+def append_manifest(zip_path, entries, mode="a"):
+    """Record [(member, data_offset, length)] with their CRCs in <day>.zip.manifest and fsync it."""
+    manifest_path = zip_path + ".manifest"
+    with zipfile.ZipFile(zip_path) as zf:
+        crcs = {member: zf.getinfo(member).CRC for member, _, _ in entries}
+    with open(manifest_path, mode) as fh:
+        for member, offset, length in entries:
+            fh.write(json.dumps({"member": member, "offset": offset, "length": length,
+                                 "crc": crcs[member]}) + "\n")
+    _fsync(manifest_path)
+
+def recover_archive(zip_path):
+    """
+    Rebuild a day zip whose central directory was lost in a crash, from the
+    byte ranges in its manifest. Clips appended after the last manifest
+    write are dropped here; their MP3s are still in the day folder.
+    """
+    if not os.path.exists(zip_path) or zipfile.is_zipfile(zip_path):
+        return False
+    manifest_path = zip_path + ".manifest"
+    part_path = zip_path + ".part"
+    kept = 0
+    with open(zip_path, "rb") as src, zipfile.ZipFile(part_path, "w", compression=zipfile.ZIP_STORED) as out:
+        for member, entry in read_manifest(manifest_path).items():
+            src.seek(entry["offset"])
+            data = src.read(entry["length"])
+            if len(data) == entry["length"] and zlib.crc32(data) == entry["crc"]:
+                out.writestr(member, data)
+                kept += 1
+    os.replace(part_path, zip_path)
+    entries = zip_member_offsets(zip_path)
+    append_manifest(zip_path, entries, mode="w")
+    conn = get_mysql_connection()
+    try:
+        index_or_mark(conn, zip_path, entries)
+    finally:
+        if conn is not None:
+            conn.close()
+    print(f"[ARCHIVE] Rebuilt {zip_path} from its manifest ({kept} clips).")
+    return True
+
+def same_clip(path, size, crc):
+    """True when the file at `path` has this size and CRC-32, like its zip member."""
+    if os.path.getsize(path) != size:
+        return False
+    value = 0
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            value = zlib.crc32(block, value)
+    return value == crc
+
+def append_clips(folder, limit=None, conn=None):
+    """
+    Append up to `limit` MP3s from a day folder to <day>.zip (all when
+    None) and return how many were archived. Existing members never move,
+    so their indexed offsets stay valid while the zip grows. Order of
+    writes: zip data (fsync), manifest lines (fsync), index rows, and only
+    then the source MP3s are removed. The zip and manifest are the record;
+    if the index rows cannot be written the day is marked for
+    reindex_pending() instead of holding the MP3s back. An MP3 whose name
+    is already in the zip is only removed when it matches that member;
+    otherwise it is left in the folder, which then stays after sealing.
+    """
+    zip_path = folder.rstrip(os.sep) + ".zip"
+    recover_archive(zip_path)
+
+    existing = {}
+    if os.path.exists(zip_path):
+        with zipfile.ZipFile(zip_path) as zf:
+            existing = {info.filename: (info.file_size, info.CRC) for info in zf.infolist()}
+
+    names, stored = [], []
+    for name in sorted(n for n in os.listdir(folder) if n.lower().endswith(".mp3")):
+        if name not in existing:
+            names.append(name)
+        elif same_clip(os.path.join(folder, name), *existing[name]):
+            stored.append(name)  # appended before a crash, not removed yet
+        else:
+            print(f"[ARCHIVE] {zip_path} already holds a different {name}; leaving it in {folder}.")
+    if limit:
+        names = names[:max(0, limit - len(stored))]
+    if not names and not stored:
+        return 0
+
+    if names:
+        with zipfile.ZipFile(zip_path, "a", compression=zipfile.ZIP_STORED) as zf:
+            for name in names:
+                zf.write(os.path.join(folder, name), arcname=name)
+        _fsync(zip_path)
+
+    # Only files written in this pass (or verified identical) may be removed.
+    wanted = set(names) | set(stored)
+    entries = [e for e in zip_member_offsets(zip_path) if e[0] in wanted]
+    append_manifest(zip_path, entries)
+    index_or_mark(conn, zip_path, entries)
+    for member, _, _ in entries:
+        os.remove(os.path.join(folder, member))
+    return len(entries)
+
+def roll_archives():
+    """Rolling pass: move up to ROLL_CHUNK clips from the day folders into their zips."""
+    budget = ROLL_CHUNK
+    conn = get_mysql_connection()
+    try:
+        if conn is not None:
+            reindex_pending(conn)
+        for day in sorted(os.listdir(archive_dir)):
+            folder = os.path.join(archive_dir, day)
+            if budget <= 0 or not DAY_FOLDER_RE.match(day) or not os.path.isdir(folder):
+                continue
+            budget -= append_clips(folder, budget, conn)
+    finally:
+        if conn is not None:
+            conn.close()
+    if budget < ROLL_CHUNK:
+        print(f"[ARCHIVE] Rolled {ROLL_CHUNK - budget} clips into day archives.")
+
+def pack_day(folder):
+    """
+    Seal a day: append whatever is left in the folder to <day>.zip, then
+    remove the folder. In rolling mode nearly everything is already in
+    the zip, so this is close to free.
+    """
+    zip_path = folder.rstrip(os.sep) + ".zip"
+    conn = get_mysql_connection()
+    try:
+        if conn is not None:
+            reindex_pending(conn)
+        count = append_clips(folder, None, conn)
+    finally:
+        if conn is not None:
+            conn.close()
+    leftover = [n for n in os.listdir(folder) if not n.endswith(".part")]
+    if leftover:
+        print(f"[ARCHIVE] {folder} still holds {len(leftover)} files; not removing it.")
+        return
+    shutil.rmtree(folder)
+    print(f"Archived and removed: {folder} -> {zip_path} ({count} clips sealed)")
+    if os.path.exists(zip_path + ".reindex"):
+        print(f"[ARCHIVE] {zip_path} is not fully indexed yet; it is retried on every pass "
+              f"(or run with --reindex).")
+
+def read_clip(filename, conn=None):
+    """
+    MP3 bytes for a transcriptions.filename, or None. Uses the index row
+    (one seek and read) when there is one; otherwise looks for a loose MP3,
+    then in the zip and legacy 7z day archives.
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    if conn is not None:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT archive_file, data_offset, data_length FROM audio_archive_index WHERE filename = %s",
+            (stem + ".wav",)
+        )
+        row = cursor.fetchone()
+        cursor.close()
+        if row:
+            with open(os.path.join(archive_dir, row[0]), "rb") as fh:
+                fh.seek(row[1])
+                return fh.read(row[2])
+
+    member = stem + ".mp3"
+    for path in glob.glob(os.path.join(archive_dir, "*", member)):
+        with open(path, "rb") as fh:
+            return fh.read()
+    for zip_path in sorted(glob.glob(os.path.join(archive_dir, "*.zip")), reverse=True):
+        with zipfile.ZipFile(zip_path) as zf:
+            if member in zf.namelist():
+                return zf.read(member)
+    for archive in sorted(glob.glob(os.path.join(archive_dir, "*.7z")), reverse=True):
+        result = subprocess.run(["7z", "e", "-so", archive, "-r", member],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        if result.returncode == 0 and result.stdout:
+            return result.stdout
+    return None
 
 def compress_yesterday():
     yesterday = datetime.date.today() - datetime.timedelta(days=1)
     folder_to_compress = os.path.join(archive_dir, yesterday.strftime("%Y-%m-%d"))
 
     if os.path.exists(folder_to_compress):
+        if ARCHIVE_FORMAT == "zip":
+            pack_day(folder_to_compress)
+            return
         archive_path = folder_to_compress + ".7z"
         # Compress with 7z for max compression
         subprocess.run([
@@ -47,12 +429,56 @@ def compress_yesterday():
         shutil.rmtree(folder_to_compress)
         print(f"Compressed and removed: {folder_to_compress}")
 
-# Schedule tasks
-schedule.every(1).minutes.do(convert_and_move)  # Check for WAVs every minute
-schedule.every().day.at("23:59").do(compress_yesterday)  # Compress yesterday at midnight
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcode processed WAVs and archive them by day.")
+    parser.add_argument("--get", metavar="FILENAME", help="extract one archived clip (transcriptions.filename)")
+    parser.add_argument("-o", "--output", help="where --get writes the MP3 (default: <name>.mp3)")
+    parser.add_argument("--pack", metavar="YYYY-MM-DD", help="pack and index one day folder now")
+    parser.add_argument("--reindex", action="store_true", help="retry index rows for days whose indexing failed")
+    args = parser.parse_args()
+
+    if args.get:
+        conn = get_mysql_connection()
+        try:
+            data = read_clip(args.get, conn)
+        finally:
+            if conn is not None:
+                conn.close()
+        if data is None:
+            raise SystemExit(f"{args.get} not found in {archive_dir}")
+        output = args.output or os.path.splitext(os.path.basename(args.get))[0] + ".mp3"
+        with open(output, "wb") as fh:
+            fh.write(data)
+        print(f"Wrote {len(data)} bytes to {output}")
+        raise SystemExit(0)
+    if args.pack:
+        pack_day(os.path.join(archive_dir, args.pack))
+        raise SystemExit(0)
+    if args.reindex:
+        conn = get_mysql_connection()
+        if conn is None:
+            raise SystemExit("No index database (ARCHIVE_DB / DB_CONFIG).")
+        try:
+            reindex_pending(conn)
+        finally:
+            conn.close()
+        pending = glob.glob(os.path.join(archive_dir, "*.zip.reindex"))
+        raise SystemExit(f"{len(pending)} day archives still not indexed." if pending else 0)
+
+    import schedule
+
+    # Schedule tasks
+    schedule.every(1).minutes.do(convert_and_move)  # Check for WAVs every minute
+    if ARCHIVE_FORMAT == "zip" and ARCHIVE_MODE == "rolling":
+        schedule.every(ROLL_EVERY_MIN).minutes.do(roll_archives)  # Small appends through the day
+    schedule.every().day.at("23:59").do(compress_yesterday)  # Compress yesterday at midnight
 
-print("Audio compression and archiving service started...")
+    print("Audio compression and archiving service started...")
 
-while True:
-    schedule.run_pending()
-    time.sleep(10)
+    while True:
+        try:
+            schedule.run_pending()
+        except Exception:
+            # One failed pass must not stop transcoding; the job runs again on its next slot.
+            traceback.print_exc()
+        time.sleep(10)
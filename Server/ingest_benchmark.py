@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Ingest throughput benchmark for transcribe_watcher.py.
+
+Generates a synthetic corpus of 16 kHz mono WAVs with net-like lengths
+(kerchunks and courtesy tones, check-ins, long overs), replays it into a
+scratch copy of the watcher's directories and reports for each mode:
+
+  files/s and audio-seconds per wall-second
+  queue wait (arrival to decode start) and end-to-end latency percentiles
+  CPU seconds (watcher plus workers) per second of audio
+
+Modes:
+
+  poll    TRANSCRIBE_MODE=subprocess, WATCH_BACKEND=poll (the original setup)
+  pool    worker pool, no batching
+  batch   worker pool with short-clip batching
+
+The "stub" engine (transcribe_engines.StubEngine) sleeps STUB_RTF x the
+audio length, so its numbers are the cost of the pipeline itself. "auto"
+adds a run with TRANSCRIBE_ENGINE when that engine is importable. Nothing is
+written to MySQL (TRANSCRIBE_DB=none). Other watcher settings such as
+WORKER_COUNT or WHISPER_MODEL are taken from the environment.
+
+Timings come from the job journal (ingest_journal.py) of each run.
+
+Usage:
+  python3 ingest_benchmark.py [--files 120] [--rate 2] [--seed 1]
+                              [--modes poll,pool,batch] [--engines stub,auto]
+                              [--workdir /tmp/tsn-bench]
+
+--rate is the mean arrival rate in files/s; 0 drops the whole corpus at
+once to measure how fast a backlog drains.
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import signal
+import sqlite3
+import argparse
+import resource
+import subprocess
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WATCHER = os.path.join(HERE, "transcribe_watcher.py")
+RATE = 16000
+
+# (class, share of files, min seconds, max seconds); lengths are log-uniform.
+CORPUS_MIX = [
+    ("kerchunk", 0.25, 0.3, 1.5),
+    ("checkin", 0.60, 2.0, 10.0),
+    ("over", 0.15, 20.0, 180.0),
+]
+
+MODES = {
+    "poll": {"TRANSCRIBE_MODE": "subprocess", "WATCH_BACKEND": "poll"},
+    "pool": {"TRANSCRIBE_MODE": "pool", "BATCH_SIZE": "1"},
+    "batch": {"TRANSCRIBE_MODE": "pool"},
+}
+
+TERMINAL_STATES = ("done", "skipped", "failed")
+STARTUP_TIMEOUT = 600
+
+# ----------------------------
+# Synthetic corpus
+# ----------------------------
+
+def synth_speech(rng, seconds):
+    """Voiced syllables on a varying pitch, grouped into phrases with pauses."""
+    n = int(seconds * RATE)
+    out = np.zeros(n, dtype=np.float32)
+    pos = int(rng.uniform(0.05, 0.3) * RATE)
+    phrase_end = pos + int(rng.uniform(1.5, 4.0) * RATE)
+    while pos < n:
+        length = min(int(rng.uniform(0.12, 0.3) * RATE), n - pos)
+        f0 = rng.uniform(90, 180)
+        k = np.arange(1, int(3400 // f0) + 1)
+        t = np.arange(length) / float(RATE)
+        phases = rng.uniform(0, 2 * np.pi, len(k))
+        voiced = (np.sin(2 * np.pi * f0 * np.outer(t, k) + phases) / np.sqrt(k)).sum(axis=1)
+        voiced *= np.hanning(length) * rng.uniform(0.2, 0.5) / (np.abs(voiced).max() + 1e-9)
+        out[pos:pos + length] = voiced
+        pos += length + int(rng.uniform(0.04, 0.12) * RATE)
+        if pos > phrase_end:
+            pos += int(rng.uniform(0.4, 0.9) * RATE)
+            phrase_end = pos + int(rng.uniform(1.5, 4.0) * RATE)
+    return out
+
+def synth_kerchunk(rng, seconds):
+    """Squelch burst, sometimes followed by a courtesy tone."""
+    n = int(seconds * RATE)
+    out = np.zeros(n, dtype=np.float32)
+    burst = min(n, int(rng.uniform(0.08, 0.25) * RATE))
+    out[:burst] = rng.standard_normal(burst) * 0.1
+    if rng.random() < 0.3 and n - burst > RATE // 4:
+        length = min(n - burst, int(rng.uniform(0.25, 0.8) * RATE))
+        t = np.arange(length) / float(RATE)
+        out[burst:burst + length] = 0.3 * np.sin(2 * np.pi * rng.uniform(600, 1200) * t)
+    return out
+
+def write_wav(path, samples):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+
+def build_corpus(corpus_dir, files, seed):
+    """Create (or reuse) the corpus and return its manifest entries."""
+    manifest_path = os.path.join(corpus_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as fh:
+            manifest = json.load(fh)
+        if manifest["files"] == files and manifest["seed"] == seed:
+            return manifest["entries"]
+        shutil.rmtree(corpus_dir)
+
+    os.makedirs(corpus_dir)
+    rng = np.random.default_rng(seed)
+    shares = np.array([c[1] for c in CORPUS_MIX])
+    picks = rng.choice(len(CORPUS_MIX), size=files, p=shares / shares.sum())
+    entries = []
+    for i, pick in enumerate(picks):
+        label, _, low, high = CORPUS_MIX[pick]
+        seconds = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+        noise = rng.standard_normal(int(seconds * RATE)).astype(np.float32) * 10 ** (-55 / 20.0)
+        make = synth_kerchunk if label == "kerchunk" else synth_speech
+        name = f"bench_{i:05d}_{label}.wav"
+        write_wav(os.path.join(corpus_dir, name), make(rng, seconds) + noise)
+        entries.append({"name": name, "class": label, "duration": round(seconds, 3)})
+
+    with open(manifest_path, "w") as fh:
+        json.dump({"files": files, "seed": seed, "entries": entries}, fh, indent=1)
+    return entries
+
+def arrival_schedule(entries, rate, seed):
+    """Shuffled (offset_sec, entry) pairs with exponential inter-arrival gaps."""
+    rng = np.random.default_rng(seed + 1)
+    order = rng.permutation(len(entries))
+    if rate <= 0:
+        return [(0.0, entries[i]) for i in order]
+    offsets = np.cumsum(rng.exponential(1.0 / rate, len(entries)))
+    offsets -= offsets[0]
+    return [(float(offsets[j]), entries[i]) for j, i in enumerate(order)]
+
+# ----------------------------
+# Running the watcher
+# ----------------------------
+
+def journal_rows(state_db):
+    if not os.path.exists(state_db):
+        return []
+    conn = sqlite3.connect(state_db)
+    try:
+        return conn.execute(
+            "SELECT filename, state, started_at, finished_at FROM jobs"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return []
+    finally:
+        conn.close()
+
+def finished_count(state_db):
+    return sum(1 for row in journal_rows(state_db) if row[1] in TERMINAL_STATES)
+
+def log_tail(log_path, lines=20):
+    with open(log_path, errors="ignore") as fh:
+        return "".join(fh.readlines()[-lines:])
+
+def wait_until_ready(proc, log_path, state_db, pool):
+    """Block until the watcher has its journal open (and its pool started)."""
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"watcher exited during startup:\n{log_tail(log_path)}")
+        with open(log_path, errors="ignore") as fh:
+            started = "[INFO] Started" in fh.read()
+        if os.path.exists(state_db) and (started or not pool):
+            return
+        time.sleep(0.2)
+    raise RuntimeError("watcher did not start in time")
+
+def run_scenario(mode, engine, schedule, corpus_dir, run_dir, timeout):
+    shutil.rmtree(run_dir, ignore_errors=True)
+    incoming = os.path.join(run_dir, "incoming")
+    os.makedirs(incoming)
+    state_db = os.path.join(run_dir, "ingest_state.sqlite3")
+    log_path = os.path.join(run_dir, "watcher.log")
+
+    env = dict(os.environ)
+    env.update(MODES[mode])
+    env.update({
+        "TRANSCRIBE_DIR": run_dir,
+        "TRANSCRIBE_ENGINE": engine,
+        "TRANSCRIBE_DB": "none",
+        "TRANSCRIBE_SCRIPT": os.path.abspath(__file__),
+        "BENCH_TRANSCRIBE_ONE": "1",
+    })
+
+    cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen([sys.executable, "-u", WATCHER], cwd=HERE, env=env,
+                                stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_until_ready(proc, log_path, state_db, env["TRANSCRIBE_MODE"] == "pool")
+
+        # Upload to a hidden .part name and rename, like push-taas-wavs.sh.
+        arrivals = {}
+        t0 = time.time()
+        for offset, entry in schedule:
+            delay = t0 + offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            part = os.path.join(incoming, "." + entry["name"] + ".part")
+            shutil.copyfile(os.path.join(corpus_dir, entry["name"]), part)
+            os.rename(part, os.path.join(incoming, entry["name"]))
+            arrivals[entry["name"]] = time.time()
+
+        deadline = time.time() + timeout
+        while finished_count(state_db) < len(schedule):
+            if proc.poll() is not None:
+                raise RuntimeError(f"watcher exited:\n{log_tail(log_path)}")
+            if time.time() > deadline:
+                print(f"[WARN] {mode}/{engine}: timed out with "
+                      f"{len(schedule) - finished_count(state_db)} files unfinished.")
+                break
+            time.sleep(0.25)
+    finally:
+        # SIGINT lets the watcher stop its pool, so worker CPU time is counted.
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(60)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+    return arrivals, journal_rows(state_db), cpu
+
+# ----------------------------
+# Report
+# ----------------------------
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return f"p50 {p50:6.2f}s  p90 {p90:6.2f}s  p99 {p99:6.2f}s"
+
+def summarize(mode, engine, entries, arrivals, rows, cpu):
+    by_name = {e["name"]: e for e in entries}
+    audio_total = sum(e["duration"] for e in entries)
+    states = {}
+    waits, latencies, by_class = [], [], {}
+    last_finish = None
+    for name, state, started_at, finished_at in rows:
+        states[state] = states.get(state, 0) + 1
+        if name not in arrivals or state not in TERMINAL_STATES:
+            continue
+        arrived = arrivals[name]
+        if started_at:
+            waits.append(started_at - arrived)
+        latencies.append(finished_at - arrived)
+        by_class.setdefault(by_name[name]["class"], []).append(finished_at - arrived)
+        last_finish = max(last_finish or finished_at, finished_at)
+
+    wall = (last_finish - min(arrivals.values())) if last_finish else 0.0
+    finished = len(latencies)
+    stats = {
+        "mode": mode,
+        "engine": engine,
+        "files_per_sec": finished / wall if wall else 0.0,
+        "wait_p50": float(np.percentile(waits, 50)) if waits else None,
+        "wait_p90": float(np.percentile(waits, 90)) if waits else None,
+        "e2e_p90": float(np.percentile(latencies, 90)) if latencies else None,
+        "cpu_per_audio_sec": cpu / audio_total if audio_total else 0.0,
+    }
+
+    print(f"== {mode} / {engine}: {finished}/{len(entries)} files, "
+          f"{audio_total:.1f}s of audio in {wall:.1f}s")
+    if wall:
+        print(f"  throughput  {stats['files_per_sec']:.2f} files/s, "
+              f"{audio_total / wall:.1f}x realtime")
+    print("  states      " + ", ".join(f"{s}={c}" for s, c in sorted(states.items())))
+    print(f"  queue wait  {percentiles(waits)}")
+    print(f"  end-to-end  {percentiles(latencies)}")
+    for label, _, _, _ in CORPUS_MIX:
+        if label in by_class:
+            print(f"    {label:<9} {percentiles(by_class[label])}")
+    print(f"  CPU         {stats['cpu_per_audio_sec']:.4f}s per audio-second ({cpu:.1f}s total)")
+    return stats
+
+def print_comparison(results):
+    def fmt(value):
+        return "     n/a" if value is None else f"{value:7.2f}s"
+    print()
+    print(f"{'mode':<6} {'engine':<15} {'files/s':>8} {'wait p50':>9} {'wait p90':>9} "
+          f"{'e2e p90':>9} {'cpu/audio-s':>12}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['engine']:<15} {r['files_per_sec']:8.2f} "
+              f"{fmt(r['wait_p50']):>9} {fmt(r['wait_p90']):>9} {fmt(r['e2e_p90']):>9} "
+              f"{r['cpu_per_audio_sec']:12.4f}")
+
+# ----------------------------
+# Entry points
+# ----------------------------
+
+def transcribe_one(path):
+    """Stand-in for transcribe_and_log.py when the watcher runs in poll mode."""
+    from transcribe_engines import load_engine
+    from transcribe_worker import WHISPER_MODEL, get_mysql_connection, log_transcription
+    text = load_engine(WHISPER_MODEL).transcribe(path)
+    log_transcription(get_mysql_connection(), os.path.basename(path), text)
+
+def resolve_engines(spec):
+    from transcribe_engines import TRANSCRIBE_ENGINE, engine_available
+    engines = []
+    for name in spec.split(","):
+        if name == "auto":
+            if TRANSCRIBE_ENGINE == "stub" or not engine_available(TRANSCRIBE_ENGINE):
+                print(f"[INFO] {TRANSCRIBE_ENGINE} is not available, skipping the real-engine runs.")
+                continue
+            name = TRANSCRIBE_ENGINE
+        if name not in engines:
+            engines.append(name)
+    return engines
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transcribe_watcher.py ingest throughput.")
+    parser.add_argument("--files", type=int, default=120)
+    parser.add_argument("--rate", type=float, default=2.0, help="mean arrivals per second, 0 = all at once")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--modes", default="poll,pool,batch")
+    parser.add_argument("--engines", default="stub,auto")
+    parser.add_argument("--workdir", default="/tmp/tsn-bench")
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds to wait per run after the last arrival")
+    args = parser.parse_args()
+
+    modes = args.modes.split(",")
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(unknown)}")
+
+    corpus_dir = os.path.join(args.workdir, "corpus")
+    entries = build_corpus(corpus_dir, args.files, args.seed)
+    schedule = arrival_schedule(entries, args.rate, args.seed)
+    print(f"[INFO] Corpus: {len(entries)} files, "
+          f"{sum(e['duration'] for e in entries):.1f}s of audio in {corpus_dir}")
+
+    results = []
+    for engine in resolve_engines(args.engines):
+        for mode in modes:
+            run_dir = os.path.join(args.workdir, f"run-{mode}-{engine}")
+            print(f"[INFO] Running {mode} / {engine} ...")
+            try:
+                arrivals, rows, cpu = run_scenario(mode, engine, schedule, corpus_dir, run_dir, args.timeout)
+            except RuntimeError as e:
+                print(f"[ERROR] {mode}/{engine}: {e}")
+                continue
+            results.append(summarize(mode, engine, entries, arrivals, rows, cpu))
+
+    if results:
+        print_comparison(results)
+
+if __name__ == "__main__":
+    if os.getenv("BENCH_TRANSCRIBE_ONE") == "1" and len(sys.argv) == 2 and not sys.argv[1].startswith("-"):
+        transcribe_one(sys.argv[1])
+    else:
+        main()
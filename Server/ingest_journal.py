@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Crash-safe job journal for transcribe_watcher.py.
+
+Every WAV the watcher sees gets a row in a local SQLite table that moves
+through these states:
+
+  queued    waiting for a worker
+  running   handed to a worker (attempts counts how often)
+  retry     failed, will be queued again at next_attempt_at
+  done      transcribed (transcription_id set)
+  skipped   screened out by the VAD or linked as a duplicate
+  failed    out of attempts, or timed out; file is in failed/
+
+A restart only has to look at queued/running/retry rows, and throughput or
+failure rates can be read straight from the table, or with:
+
+  python3 ingest_journal.py <state_db> [hours]
+"""
+
+import sys
+import time
+import sqlite3
+
+MAX_ATTEMPTS = 3
+RETRY_BASE_SEC = 30
+
+class IngestJournal:
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                filename TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                audio_sec REAL,
+                queued_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                next_attempt_at REAL,
+                elapsed_sec REAL,
+                transcription_id INTEGER,
+                last_error TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, next_attempt_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)")
+        self.conn.commit()
+
+    def recover(self):
+        """
+        Put jobs that were running when the watcher died back in the queue
+        and return every name that is ready to run.
+        """
+        self.conn.execute("UPDATE jobs SET state = 'queued' WHERE state = 'running'")
+        self.conn.commit()
+        return self.ready()
+
+    def ready(self):
+        """Queued jobs plus retries whose backoff has expired."""
+        now = time.time()
+        rows = self.conn.execute(
+            "SELECT filename FROM jobs WHERE state = 'queued' "
+            "OR (state = 'retry' AND next_attempt_at <= ?)", (now,)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def due_retries(self):
+        rows = self.conn.execute(
+            "SELECT filename FROM jobs WHERE state = 'retry' AND next_attempt_at <= ?",
+            (time.time(),)
+        ).fetchall()
+        return [r[0] for r in rows]
+
+    def enqueue(self, names):
+        """
+        Journal newly seen files and return the ones that may be scheduled.
+        Running jobs and retries still in backoff are held back; a finished
+        name that shows up again starts over.
+        """
+        now = time.time()
+        ready = []
+        for name in names:
+            row = self.conn.execute(
+                "SELECT state, next_attempt_at FROM jobs WHERE filename = ?", (name,)
+            ).fetchone()
+            if row is None:
+                self.conn.execute(
+                    "INSERT INTO jobs (filename, state, queued_at) VALUES (?, 'queued', ?)",
+                    (name, now)
+                )
+            elif row[0] == "running":
+                continue
+            elif row[0] == "retry":
+                if row[1] > now:
+                    continue
+                self.conn.execute("UPDATE jobs SET state = 'queued' WHERE filename = ?", (name,))
+            elif row[0] in ("done", "skipped", "failed"):
+                self.conn.execute("""
+                    UPDATE jobs SET state = 'queued', attempts = 0, queued_at = ?,
+                        started_at = NULL, finished_at = NULL, next_attempt_at = NULL,
+                        elapsed_sec = NULL, transcription_id = NULL, last_error = NULL
+                    WHERE filename = ?
+                """, (now, name))
+            ready.append(name)
+        self.conn.commit()
+        return ready
+
+    def attempts(self, name):
+        """How often the file has been handed to a worker since it was queued."""
+        row = self.conn.execute("SELECT attempts FROM jobs WHERE filename = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def start(self, name, audio_sec=None):
+        self.conn.execute("""
+            UPDATE jobs SET state = 'running', attempts = attempts + 1,
+                started_at = ?, audio_sec = COALESCE(?, audio_sec)
+            WHERE filename = ?
+        """, (time.time(), audio_sec, name))
+        self.conn.commit()
+
+    def done(self, name, transcription_id=None, elapsed=None):
+        self.conn.execute("""
+            UPDATE jobs SET state = 'done', finished_at = ?, elapsed_sec = ?,
+                transcription_id = ?, last_error = NULL
+            WHERE filename = ?
+        """, (time.time(), elapsed, transcription_id, name))
+        self.conn.commit()
+
+    def skip(self, name, reason, transcription_id=None):
+        self.conn.execute("""
+            UPDATE jobs SET state = 'skipped', finished_at = ?, transcription_id = ?,
+                last_error = ?
+            WHERE filename = ?
+        """, (time.time(), transcription_id, reason, name))
+        self.conn.commit()
+
+    def fail(self, name, error, retry=True):
+        """
+        Record a failed attempt. Returns the retry delay in seconds, or None
+        when the job is finished for good and the file should go to failed/.
+        """
+        row = self.conn.execute("SELECT attempts FROM jobs WHERE filename = ?", (name,)).fetchone()
+        attempts = row[0] if row else MAX_ATTEMPTS
+        now = time.time()
+        if retry and attempts < MAX_ATTEMPTS:
+            delay = RETRY_BASE_SEC * 2 ** max(0, attempts - 1)
+            self.conn.execute("""
+                UPDATE jobs SET state = 'retry', next_attempt_at = ?, last_error = ?,
+                    elapsed_sec = ? - started_at
+                WHERE filename = ?
+            """, (now + delay, error, now, name))
+            self.conn.commit()
+            return delay
+        self.conn.execute("""
+            UPDATE jobs SET state = 'failed', finished_at = ?, last_error = ?,
+                elapsed_sec = ? - started_at
+            WHERE filename = ?
+        """, (now, error, now, name))
+        self.conn.commit()
+        return None
+
+    def stats(self, since):
+        """Per-state counts and timing for jobs finished after `since`."""
+        rows = self.conn.execute("""
+            SELECT state, COUNT(*), SUM(audio_sec), SUM(elapsed_sec), AVG(attempts)
+            FROM jobs WHERE finished_at >= ? GROUP BY state
+        """, (since,)).fetchall()
+        backlog = self.conn.execute(
+            "SELECT state, COUNT(*) FROM jobs WHERE state IN ('queued', 'running', 'retry') GROUP BY state"
+        ).fetchall()
+        return rows, backlog
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 ingest_journal.py <state_db> [hours]")
+        sys.exit(1)
+
+    hours = float(sys.argv[2]) if len(sys.argv) > 2 else 24.0
+    journal = IngestJournal(sys.argv[1])
+    rows, backlog = journal.stats(time.time() - hours * 3600)
+
+    total = sum(r[1] for r in rows)
+    print(f"Jobs finished in the last {hours:g}h: {total} ({total / hours:.1f}/h)")
+    for state, count, audio, elapsed, attempts in rows:
+        line = f"  {state:<8} {count:>7}  {100.0 * count / total:5.1f}%  avg attempts {attempts or 0:.2f}"
+        if audio and elapsed:
+            line += f"  audio {audio / 60:.1f} min, decode {elapsed / 60:.1f} min (RTF {elapsed / audio:.2f})"
+        print(line)
+    print("Backlog: " + (", ".join(f"{s}={c}" for s, c in backlog) or "empty"))
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Re-run transcription over archived audio, e.g. after moving to a better
+model, and keep the results as new versions of the existing transcripts.
+
+Each transcript's clip is found without unpacking any day to disk:
+
+  indexed   audio_archive_index row: the worker reads the byte range of
+            the day zip itself (one seek), so archive reads run in
+            parallel with decoding
+  loose     an MP3 still in archive/<date>/, read the same way
+  zip       a day zip without index rows (ARCHIVE_DB=none at the time)
+  7z        legacy solid 7z day: each archive is decompressed once, in
+            archive order, through `7z x -so`, and the clips are cut from
+            that stream by the sizes in its listing
+
+Clips go to the transcribe_worker pool in groups of RETRANSCRIBE_BATCH.
+The workers decode the MP3 through an ffmpeg pipe and return the text.
+Only a few groups are read ahead, so memory stays flat and the workers
+are never waiting on the archive.
+
+Results are written to transcription_versions (transcription_id,
+version); the original row in `transcriptions` is version 0 and is left
+alone. Without --version, a run resumes the highest version already made
+with the same engine and model, or starts the next one. Transcripts that
+already have a row for the version are skipped, so an interrupted run can
+simply be started again.
+
+Usage:
+  python3 retranscribe_archive.py --model large-v3 [--workers N]
+                                  [--from-id N] [--to-id N] [--limit N]
+                                  [--version N] [--plan]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from collections import deque
+
+import convert_and_archive as ca
+from transcribe_engines import TRANSCRIBE_ENGINE, engine_available
+from transcribe_worker import WHISPER_MODEL, WorkerPool, default_worker_count, get_mysql_connection
+
+# ----------------------------
+# Config
+# ----------------------------
+
+RETRANSCRIBE_BATCH = int(os.getenv("RETRANSCRIBE_BATCH", "8"))  # clips per worker job
+BATCH_MAX_SEC = 15.0  # longer clips in a job are decoded one by one
+PLAN_ROWS = 20000  # transcripts planned at a time; a 7z day is streamed once per plan
+WRITE_EVERY = 50  # versions per INSERT
+JOB_TIMEOUT = 1500
+SEVENZIP = os.getenv("SEVENZIP", "7z")
+
+# ----------------------------
+# Database Helpers
+# ----------------------------
+
+def get_version(conn, engine, model, requested=None):
+    if requested is not None:
+        return requested
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT MAX(version) FROM transcription_versions WHERE engine = %s AND model = %s",
+        (engine, model)
+    )
+    row = cursor.fetchone()
+    if row and row[0] is not None:
+        cursor.close()
+        return row[0]
+    cursor.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM transcription_versions")
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else 1
+
+def get_pending(conn, version, after_id, to_id, limit):
+    """Transcripts without this version yet, with their index row when there is one."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT t.id, t.filename, a.archive_file, a.data_offset, a.data_length
+        FROM transcriptions t
+        LEFT JOIN transcription_versions v ON v.transcription_id = t.id AND v.version = %s
+        LEFT JOIN audio_archive_index a ON a.filename = t.filename
+        WHERE t.id > %s AND t.id <= %s AND v.id IS NULL
+        ORDER BY t.id
+        LIMIT %s
+    """, (version, after_id, to_id, limit))
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+def save_versions(conn, rows):
+    """rows: [(transcription_id, version, engine, model, text)]"""
+    conn.ping(reconnect=True, attempts=3, delay=1)
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            INSERT INTO transcription_versions (transcription_id, version, engine, model, transcription)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                engine = VALUES(engine),
+                model = VALUES(model),
+                transcription = VALUES(transcription)
+        """, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+# ----------------------------
+# Archive Sources
+# ----------------------------
+
+def list_7z(archive):
+    """[(path, size)] of the files in a 7z archive, in archive order."""
+    result = subprocess.run([SEVENZIP, "l", "-slt", archive],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    if result.returncode != 0:
+        print(f"[RETRANSCRIBE] Cannot list {archive} (exit {result.returncode}).")
+        return []
+    entries, item, in_items = [], {}, False
+    for line in result.stdout.splitlines() + [""]:
+        if line.startswith("----------"):
+            in_items = True
+        elif not in_items:
+            continue
+        elif not line.strip():
+            if item.get("Path") and item.get("Folder") != "+" and not item.get("Attributes", "").startswith("D"):
+                entries.append((item["Path"], int(item.get("Size") or 0)))
+            item = {}
+        elif " = " in line:
+            key, value = line.split(" = ", 1)
+            item[key] = value
+    return entries
+
+def stream_7z(archive, wanted):
+    """
+    Yield (member, data) for the wanted members of a solid 7z day, from one
+    sequential decompression. wanted: [(member_path, size)] in archive order.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".lst", delete=False) as fh:
+        fh.write("".join(member + "\n" for member, _ in wanted))
+        list_path = fh.name
+    try:
+        proc = subprocess.Popen([SEVENZIP, "x", "-so", "-spd", archive, f"@{list_path}"],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            # 7z writes the selected files in archive order.
+            for member, size in wanted:
+                data = proc.stdout.read(size)
+                if len(data) != size:
+                    print(f"[RETRANSCRIBE] {archive} ended early at {member}.")
+                    return
+                yield member, data
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+    finally:
+        os.remove(list_path)
+
+class ArchiveLocator:
+    """
+    Finds the clip of a transcript that has no audio_archive_index row.
+    Loose MP3s, unindexed zips and 7z listings are each read once, the
+    first time a clip is not in the index.
+    """
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.loose = None
+        self.zipped = None
+        self.sevenzip = None
+
+    def _load(self):
+        self.loose, self.zipped, self.sevenzip = {}, {}, {}
+        for name in sorted(os.listdir(self.archive_dir)):
+            path = os.path.join(self.archive_dir, name)
+            if os.path.isdir(path) and ca.DAY_FOLDER_RE.match(name):
+                for member in os.listdir(path):
+                    if member.lower().endswith(".mp3"):
+                        self.loose[member] = os.path.join(path, member)
+            elif name.endswith(".zip"):
+                try:
+                    for member, offset, length in ca.zip_member_offsets(path):
+                        self.zipped[os.path.basename(member)] = (path, offset, length)
+                except (OSError, ValueError) as e:
+                    print(f"[RETRANSCRIBE] Skipping {path}: {e}")
+            elif name.endswith(".7z"):
+                for position, (member, size) in enumerate(list_7z(path)):
+                    self.sevenzip[os.path.basename(member)] = (path, member, size, position)
+
+    def locate(self, filename):
+        """(kind, source): a ("range", ...) source, ("7z", archive, member, size, position), or (None, None)."""
+        if self.loose is None:
+            self._load()
+        member = os.path.splitext(os.path.basename(filename))[0] + ".mp3"
+        path = self.loose.get(member)
+        if path and os.path.exists(path):
+            return "loose", ("range", path, 0, os.path.getsize(path))
+        if member in self.zipped:
+            return "zip", ("range",) + self.zipped[member]
+        if member in self.sevenzip:
+            return "7z", ("7z",) + self.sevenzip[member]
+        return None, None
+
+def plan(rows, locator):
+    """
+    Split a page of pending transcripts into clips that can be read by
+    range and 7z clips grouped by archive. Returns (ranged, by_7z, counts).
+    """
+    ranged, by_7z = [], {}
+    counts = {"indexed": 0, "loose": 0, "zip": 0, "7z": 0, "missing": 0}
+    for tid, filename, archive_file, offset, length in rows:
+        if archive_file:
+            kind, source = "indexed", ("range", os.path.join(ca.archive_dir, archive_file), offset, length)
+        else:
+            kind, source = locator.locate(filename)
+        if source is None:
+            counts["missing"] += 1
+            continue
+        counts[kind] += 1
+        if source[0] == "7z":
+            _, archive, member, size, position = source
+            # Re-uploads can give several transcripts the same member.
+            entry = by_7z.setdefault(archive, {}).setdefault(member, (size, position, []))
+            entry[2].append((tid, filename))
+        else:
+            ranged.append((str(tid), filename, source))
+    return ranged, by_7z, counts
+
+def clip_stream(ranged, by_7z):
+    """(key, label, source) for every planned clip; 7z days are decompressed lazily, one at a time."""
+    yield from ranged
+    for archive in sorted(by_7z):
+        members = by_7z[archive]
+        wanted = sorted(members, key=lambda m: members[m][1])
+        for member, data in stream_7z(archive, [(m, members[m][0]) for m in wanted]):
+            for tid, filename in members[member][2]:
+                yield str(tid), filename, ("bytes", data)
+
+# ----------------------------
+# Runner
+# ----------------------------
+
+def run_plan(pool, conn, stream, version, model, stats):
+    """Keep every worker busy with clips from `stream` and write the results."""
+    pending_rows = []
+    ahead = deque()
+    exhausted = False
+    while True:
+        # Read up to one job ahead of the free slots so a finished worker
+        # gets its next group straight away.
+        while not exhausted and len(ahead) < (pool.free_slots() + 1) * RETRANSCRIBE_BATCH:
+            item = next(stream, None)
+            if item is None:
+                exhausted = True
+                break
+            ahead.append(item)
+        while ahead and pool.free_slots() > 0:
+            group = [ahead.popleft() for _ in range(min(RETRANSCRIBE_BATCH, len(ahead)))]
+            pool.submit_sources(group, model, BATCH_MAX_SEC)
+        if exhausted and not ahead and not pool.in_flight:
+            break
+
+        for result in pool.collect(timeout=0.5):
+            if result.ok:
+                pending_rows.append((int(result.key), version, TRANSCRIBE_ENGINE, model, (result.text or "").strip()))
+                stats["done"] += 1
+                stats["decode_sec"] += result.elapsed or 0.0
+            else:
+                stats["failed"] += 1
+                print(f"[RETRANSCRIBE] {result.path} (id {result.key}) failed: "
+                      f"{str(result.detail).strip().splitlines()[-1] if result.detail else 'unknown'}")
+        if len(pending_rows) >= WRITE_EVERY:
+            save_versions(conn, pending_rows)
+            pending_rows = []
+        if time.time() - stats["reported"] >= 30:
+            report(stats)
+    if pending_rows:
+        save_versions(conn, pending_rows)
+
+def report(stats):
+    elapsed = time.time() - stats["started"]
+    stats["reported"] = time.time()
+    print(f"[RETRANSCRIBE] {stats['done']} done, {stats['failed']} failed in {elapsed:.0f}s "
+          f"({stats['done'] / elapsed if elapsed else 0:.2f} clips/s, "
+          f"{stats['decode_sec'] / elapsed if elapsed else 0:.1f} worker-seconds decoding per second)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-transcribe archived clips into transcription_versions.")
+    parser.add_argument("--model", default=WHISPER_MODEL)
+    parser.add_argument("--workers", type=int, default=default_worker_count())
+    parser.add_argument("--from-id", type=int, default=0)
+    parser.add_argument("--to-id", type=int, default=2**31 - 1)
+    parser.add_argument("--limit", type=int, help="stop after this many transcripts")
+    parser.add_argument("--version", type=int, help="version number to write (default: resume or next)")
+    parser.add_argument("--plan", action="store_true", help="only report where the clips would be read from")
+    args = parser.parse_args()
+
+    if not args.plan and not engine_available():
+        print(f"[RETRANSCRIBE] {TRANSCRIBE_ENGINE} is not importable here.")
+        return 1
+
+    conn = get_mysql_connection()
+    pool = None
+    try:
+        version = get_version(conn, TRANSCRIBE_ENGINE, args.model, args.version)
+        print(f"[RETRANSCRIBE] Writing version {version} ({TRANSCRIBE_ENGINE} {args.model})")
+        locator = ArchiveLocator(ca.archive_dir)
+        totals = {"indexed": 0, "loose": 0, "zip": 0, "7z": 0, "missing": 0}
+        stats = {"done": 0, "failed": 0, "decode_sec": 0.0, "started": time.time(), "reported": time.time()}
+        after_id = args.from_id - 1 if args.from_id else 0
+        remaining = args.limit
+        while remaining is None or remaining > 0:
+            rows = get_pending(conn, version, after_id, args.to_id,
+                               PLAN_ROWS if remaining is None else min(PLAN_ROWS, remaining))
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+            ranged, by_7z, counts = plan(rows, locator)
+            for kind, count in counts.items():
+                totals[kind] += count
+            if args.plan:
+                continue
+            if pool is None:
+                pool = WorkerPool(args.workers, model_name=args.model, timeout=JOB_TIMEOUT)
+                pool.start()
+                print(f"[RETRANSCRIBE] Started {args.workers} {TRANSCRIBE_ENGINE} workers ({args.model}).")
+            run_plan(pool, conn, clip_stream(ranged, by_7z), version, args.model, stats)
+
+        print("[RETRANSCRIBE] Clips: " + ", ".join(f"{kind} {count}" for kind, count in totals.items()))
+        if not args.plan:
+            report(stats)
+    finally:
+        if pool is not None:
+            pool.stop()
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
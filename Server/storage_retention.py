@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+"""
+Disk budgets for the audio the pipeline keeps around.
+
+Files are counted in four tiers:
+
+  wav      processed/*.wav waiting for convert_and_archive.py
+  mp3      archive/<date>/*.mp3 not yet in a day archive
+  sealed   archive/<date>.zip (+ .manifest) and legacy .7z days
+  failed   failed/, files the watcher gave up on
+
+Each tier can have a byte budget (RETAIN_*_GB, 0 = no limit). Over
+budget, the oldest files of that tier are removed until it fits. When the
+disk has less than DISK_MIN_FREE_GB free, failed, sealed and then mp3
+files are removed, oldest first, until it does. Raw WAVs are only removed
+by their own budget, since they have no MP3 yet.
+
+Clips linked to a net (net_session_transcripts) are kept for
+NET_KEEP_DAYS (0 = forever). A day zip holding such clips is thinned to
+just those clips instead of being deleted, and audio_archive_index is
+updated to match. Legacy .7z days are removed whole. When the net clips
+cannot be loaded (no database, or it is unreachable), only failed/ is
+evicted.
+
+Sizes are cached in a SQLite file (RETENTION_DB). A directory is only
+listed again when its mtime changes, so a pass is a few stat() calls;
+every FULL_SCAN_HOURS everything is listed again. Each pass records the
+tier totals in the `usage` table and every removal in `evictions`.
+
+Usage:
+  python3 storage_retention.py            # one pass
+  python3 storage_retention.py --loop     # keep running
+  python3 storage_retention.py --dry-run  # report what would be removed
+  python3 storage_retention.py --status   # usage, growth and budgets
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import zipfile
+import datetime
+import argparse
+
+import convert_and_archive as ca
+
+# ----------------------------
+# Config
+# ----------------------------
+
+# processed/ and archive/ come from convert_and_archive; everything lives under its BASE_DIR.
+FAILED_DIR = os.path.join(ca.BASE_DIR, "failed")
+RETENTION_DB = os.getenv("RETENTION_DB", os.path.join(ca.BASE_DIR, "retention_state.sqlite3"))
+
+GB = 1024 ** 3
+BUDGETS = {
+    "wav": float(os.getenv("RETAIN_WAV_GB", "0")),
+    "mp3": float(os.getenv("RETAIN_MP3_GB", "0")),
+    "sealed": float(os.getenv("RETAIN_SEALED_GB", "0")),
+    "failed": float(os.getenv("RETAIN_FAILED_GB", "5")),
+}
+DISK_MIN_FREE_GB = float(os.getenv("DISK_MIN_FREE_GB", "2"))
+FLOOR_ORDER = ("failed", "sealed", "mp3")  # what goes first when the disk is nearly full
+NET_KEEP_DAYS = int(os.getenv("NET_KEEP_DAYS", "365"))
+FULL_SCAN_HOURS = 24
+LOOP_SLEEP = 60
+USAGE_KEEP_DAYS = 90
+RACY_SEC = 2  # a directory changed this close to its last listing is listed again
+
+TIERS = ("wav", "mp3", "sealed", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    stamp REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_tier ON files (tier, stamp);
+CREATE INDEX IF NOT EXISTS idx_files_dir ON files (dir);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    scanned_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS usage (
+    ts REAL NOT NULL,
+    tier TEXT NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_usage_ts ON usage (ts);
+CREATE TABLE IF NOT EXISTS evictions (
+    ts REAL NOT NULL,
+    tier TEXT NOT NULL,
+    path TEXT NOT NULL,
+    bytes INTEGER NOT NULL,
+    action TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+"""
+
+def open_db(path=None):
+    conn = sqlite3.connect(path or RETENTION_DB)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+# ----------------------------
+# Incremental Scan
+# ----------------------------
+
+def day_stamp(name):
+    """Local midnight of the <YYYY-MM-DD> a file or folder is named after, or None."""
+    stem = name.split(".", 1)[0]
+    if not ca.DAY_FOLDER_RE.match(stem):
+        return None
+    return time.mktime(datetime.datetime.strptime(stem, "%Y-%m-%d").timetuple())
+
+def tier_roots():
+    """(directory, tier_of(name)) for every directory listed directly."""
+    return [
+        (ca.processed_dir, lambda name: "wav" if name.lower().endswith(".wav") else None),
+        (FAILED_DIR, lambda name: "failed"),
+        (ca.archive_dir, lambda name: "sealed" if name.endswith((".zip", ".7z", ".zip.manifest")) else None),
+    ]
+
+def mp3_tier(name):
+    return "mp3" if name.lower().endswith(".mp3") else None
+
+def forget_dir(db, path):
+    db.execute("DELETE FROM files WHERE dir = ?", (path,))
+    db.execute("DELETE FROM dirs WHERE path = ?", (path,))
+
+def scan_dir(db, path, tier_of, full=False):
+    """List `path` again if it changed since the cached listing. Returns True if it did."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        forget_dir(db, path)
+        return False
+    row = db.execute("SELECT mtime_ns, scanned_at FROM dirs WHERE path = ?", (path,)).fetchone()
+    if not full and row and row[0] == st.st_mtime_ns and st.st_mtime_ns / 1e9 < row[1] - RACY_SEC:
+        return False
+
+    scanned_at = time.time()
+    folder_stamp = day_stamp(os.path.basename(path))
+    rows = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.endswith(".part") or not entry.is_file(follow_symlinks=False):
+                continue
+            tier = tier_of(entry.name)
+            if tier is None:
+                continue
+            try:
+                est = entry.stat()
+            except FileNotFoundError:
+                continue
+            stamp = folder_stamp or day_stamp(entry.name) or est.st_mtime
+            rows.append((entry.path, path, tier, est.st_size, est.st_mtime, stamp))
+    db.execute("DELETE FROM files WHERE dir = ?", (path,))
+    db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+    db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (path, st.st_mtime_ns, scanned_at))
+    return True
+
+def day_folders(path):
+    try:
+        with os.scandir(path) as entries:
+            return [e.path for e in entries if e.is_dir(follow_symlinks=False) and ca.DAY_FOLDER_RE.match(e.name)]
+    except FileNotFoundError:
+        return []
+
+def refresh(db, full=False):
+    """Bring the cached sizes up to date. Returns how many directories were listed."""
+    if not full:
+        last = db.execute("SELECT value FROM state WHERE key = 'full_scan'").fetchone()
+        full = last is None or time.time() - last[0] > FULL_SCAN_HOURS * 3600
+    listed = 0
+    archive_changed = False
+    for path, tier_of in tier_roots():
+        changed = scan_dir(db, path, tier_of, full)
+        listed += changed
+        archive_changed |= changed and path == ca.archive_dir
+
+    # Day folders come and go with the archive directory's own listing.
+    known = {r[0] for r in db.execute("SELECT path FROM dirs WHERE path LIKE ?", (os.path.join(ca.archive_dir, "%"),))}
+    folders = set(day_folders(ca.archive_dir)) if archive_changed else known
+    for path in known - folders:
+        forget_dir(db, path)
+    for path in sorted(folders):
+        listed += scan_dir(db, path, mp3_tier, full)
+
+    # Day zips grow in place while rolling, which does not touch the directory.
+    for path, size, mtime in db.execute("SELECT path, size, mtime FROM files WHERE tier = 'sealed'").fetchall():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            db.execute("DELETE FROM files WHERE path = ?", (path,))
+            continue
+        if st.st_size != size or st.st_mtime != mtime:
+            db.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?", (st.st_size, st.st_mtime, path))
+
+    if full:
+        db.execute("INSERT OR REPLACE INTO state VALUES ('full_scan', ?)", (time.time(),))
+    db.commit()
+    return listed
+
+def tier_usage(db):
+    usage = {tier: (0, 0) for tier in TIERS}
+    for tier, files, size in db.execute("SELECT tier, COUNT(*), COALESCE(SUM(size), 0) FROM files GROUP BY tier"):
+        usage[tier] = (files, size)
+    return usage
+
+# ----------------------------
+# Eviction
+# ----------------------------
+
+def clip_key(path):
+    """Case-folded stem shared by a clip's WAV, its MP3 and its archive member."""
+    return os.path.splitext(os.path.basename(path))[0].lower()
+
+def get_net_clips():
+    """clip_key of every clip linked to a net, or None when they cannot be loaded."""
+    conn = ca.get_mysql_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT DISTINCT t.filename
+            FROM net_session_transcripts n
+            JOIN transcriptions t ON t.id = n.transcription_id
+        """)
+        clips = {clip_key(row[0]) for row in cursor.fetchall() if row[0]}
+        cursor.close()
+        return clips
+    except ca.mysql.connector.Error as e:
+        print(f"[RETENTION] Could not load net clips: {e}")
+        return None
+    finally:
+        conn.close()
+
+class Evictor:
+    """Removes files tier by tier, oldest first, keeping net clips that are still protected."""
+
+    def __init__(self, db, net_clips, dry_run=False):
+        self.db = db
+        self.net_clips = net_clips or set()
+        self.dry_run = dry_run
+        self.now = time.time()
+        self.today = day_stamp(datetime.date.today().isoformat())
+
+    def protected(self, filename, stamp):
+        if NET_KEEP_DAYS and self.now - stamp > NET_KEEP_DAYS * 86400:
+            return False
+        return clip_key(filename) in self.net_clips
+
+    def log(self, tier, path, freed, action):
+        print(f"[RETENTION] {'Would ' + action if self.dry_run else action.capitalize()} "
+              f"{path} ({freed / 1024 ** 2:.1f} MB, {tier})")
+        if not self.dry_run:
+            self.db.execute("INSERT INTO evictions VALUES (?, ?, ?, ?, ?)", (time.time(), tier, path, freed, action))
+
+    def remove(self, tier, path, size):
+        if not self.dry_run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.db.execute("DELETE FROM files WHERE path = ?", (path,))
+        self.log(tier, path, size, "remove")
+        return size
+
+    def evict(self, tier, need):
+        """Free at least `need` bytes from `tier` if it can. Returns the bytes freed."""
+        freed = 0
+        rows = self.db.execute(
+            "SELECT path, size, stamp FROM files WHERE tier = ? ORDER BY stamp, path", (tier,)
+        ).fetchall()
+        for path, size, stamp in rows:
+            if freed >= need:
+                break
+            name = os.path.basename(path)
+            if tier == "mp3" and stamp >= self.today:
+                break  # today's clips are still being appended to the day archive
+            if tier == "sealed":
+                if name.endswith(".manifest"):
+                    continue  # goes with its zip
+                try:
+                    freed += self.evict_day(path, size, stamp)
+                except (zipfile.BadZipFile, OSError) as e:
+                    print(f"[RETENTION] Skipping unreadable {path}: {e}")
+            elif tier == "failed" or not self.protected(name, stamp):
+                freed += self.remove(tier, path, size)
+        if not self.dry_run:
+            self.db.commit()
+        return freed
+
+    def evict_day(self, path, size, stamp):
+        if os.path.isdir(path.rsplit(".", 1)[0]):
+            return 0  # not sealed yet
+        if path.endswith(".7z"):
+            return self.remove("sealed", path, size)
+
+        with zipfile.ZipFile(path) as zf:
+            members = zf.namelist()
+        keep = [m for m in members if self.protected(m, stamp)]
+        if len(keep) == len(members):
+            return 0
+        manifest = path + ".manifest"
+        manifest_row = self.db.execute("SELECT size FROM files WHERE path = ?", (manifest,)).fetchone()
+        if not keep:
+            freed = self.remove("sealed", path, size)
+            if manifest_row:
+                freed += self.remove("sealed", manifest, manifest_row[0])
+            if not self.dry_run:
+                self.drop_index(path)
+            return freed
+
+        if self.dry_run:
+            self.log("sealed", path, 0, f"thin to {len(keep)} net clips")
+            return 0
+        part_path = path + ".part"
+        try:
+            with zipfile.ZipFile(path) as src, zipfile.ZipFile(part_path, "w", compression=zipfile.ZIP_STORED) as out:
+                for member in keep:
+                    out.writestr(src.getinfo(member), src.read(member))
+        except Exception:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        os.replace(part_path, path)
+        entries = ca.zip_member_offsets(path)
+        ca.append_manifest(path, entries, mode="w")
+        # Every offset moved: replace the day's rows, or leave a .reindex marker.
+        conn = ca.get_mysql_connection()
+        try:
+            ca.index_or_mark(conn, path, entries, replace=True)
+        finally:
+            if conn is not None:
+                conn.close()
+        freed = size - os.path.getsize(path)
+        self.db.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?",
+                        (os.path.getsize(path), os.path.getmtime(path), path))
+        self.log("sealed", path, freed, f"thin to {len(keep)} net clips")
+        return freed
+
+    def drop_index(self, zip_path):
+        conn = ca.get_mysql_connection()
+        if conn is None:
+            return
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM audio_archive_index WHERE archive_file = %s",
+                           (os.path.relpath(zip_path, ca.archive_dir),))
+            conn.commit()
+            cursor.close()
+        except ca.mysql.connector.Error as e:
+            print(f"[RETENTION] Could not drop index rows of {zip_path}: {e}")
+        finally:
+            conn.close()
+
+def enforce(db, dry_run=False):
+    """Apply the tier budgets and the free-space floor. Returns bytes freed per tier."""
+    usage = tier_usage(db)
+    wanted = {}
+    for tier in TIERS:
+        over = usage[tier][1] - BUDGETS[tier] * GB
+        if BUDGETS[tier] and over > 0:
+            wanted[tier] = over
+    free = shutil.disk_usage(ca.archive_dir).free
+    short = DISK_MIN_FREE_GB * GB - free if DISK_MIN_FREE_GB else 0
+    if not wanted and short <= 0:
+        return {}
+
+    floor_order = FLOOR_ORDER
+    net_clips = get_net_clips()
+    if net_clips is None:
+        # Without the net list any clip might be net audio, so only failed/ may go.
+        print("[RETENTION] ERROR: net clips could not be loaded; only failed/ is evicted this pass.")
+        wanted = {tier: need for tier, need in wanted.items() if tier == "failed"}
+        floor_order = ("failed",)
+    evictor = Evictor(db, net_clips, dry_run)
+    freed = {}
+    for tier, need in wanted.items():
+        freed[tier] = evictor.evict(tier, need)
+    short -= sum(freed.values())
+    for tier in floor_order:
+        if short <= 0:
+            break
+        got = evictor.evict(tier, short)
+        freed[tier] = freed.get(tier, 0) + got
+        short -= got
+    if short > 0:
+        print(f"[RETENTION] Still {short / GB:.2f} GB short of DISK_MIN_FREE_GB={DISK_MIN_FREE_GB:g}; "
+              f"nothing left that may be removed.")
+    return freed
+
+# ----------------------------
+# Metrics
+# ----------------------------
+
+def record_usage(db, usage):
+    now = time.time()
+    db.executemany("INSERT INTO usage VALUES (?, ?, ?, ?)",
+                   [(now, tier, files, size) for tier, (files, size) in usage.items()])
+    db.execute("DELETE FROM usage WHERE ts < ?", (now - USAGE_KEEP_DAYS * 86400,))
+    db.commit()
+
+def daily_growth(db, tier, size):
+    """Bytes per day over roughly the last day of `usage`, or None without enough history."""
+    row = db.execute(
+        "SELECT ts, bytes FROM usage WHERE tier = ? AND ts <= ? ORDER BY ts DESC LIMIT 1",
+        (tier, time.time() - 86400)
+    ).fetchone()
+    if row is None:
+        row = db.execute("SELECT ts, bytes FROM usage WHERE tier = ? ORDER BY ts LIMIT 1", (tier,)).fetchone()
+    if row is None or time.time() - row[0] < 3600:
+        return None
+    return (size - row[1]) * 86400 / (time.time() - row[0])
+
+def print_status(db):
+    usage = tier_usage(db)
+    print(f"{'tier':<8} {'files':>8} {'GB':>9} {'budget':>8} {'GB/day':>8}")
+    for tier in TIERS:
+        files, size = usage[tier]
+        growth = daily_growth(db, tier, size)
+        print(f"{tier:<8} {files:>8} {size / GB:>9.2f} "
+              f"{(f'{BUDGETS[tier]:g}' if BUDGETS[tier] else '-'):>8} "
+              f"{(f'{growth / GB:+.2f}' if growth is not None else '-'):>8}")
+    disk = shutil.disk_usage(ca.archive_dir)
+    total_growth = sum(g for g in (daily_growth(db, t, usage[t][1]) for t in TIERS) if g)
+    line = f"disk: {disk.free / GB:.1f} GB free of {disk.total / GB:.1f} GB (floor {DISK_MIN_FREE_GB:g} GB)"
+    if total_growth > 0:
+        line += f", full in about {max(disk.free - DISK_MIN_FREE_GB * GB, 0) / total_growth:.1f} days"
+    print(line)
+    since = time.time() - 86400
+    evicted = db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM evictions WHERE ts >= ?", (since,)).fetchone()
+    print(f"evicted in the last 24h: {evicted[0]} files, {evicted[1] / GB:.2f} GB")
+
+def run_once(db, dry_run=False, full=False):
+    started = time.time()
+    listed = refresh(db, full)
+    freed = enforce(db, dry_run)
+    usage = tier_usage(db)
+    if not dry_run:
+        record_usage(db, usage)
+    print("[RETENTION] " + ", ".join(
+        f"{tier} {usage[tier][1] / GB:.2f} GB/{usage[tier][0]}" for tier in TIERS
+    ) + f"; listed {listed} dirs, freed {sum(freed.values()) / GB:.2f} GB in {time.time() - started:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep processed/, archive/ and failed/ within their disk budgets.")
+    parser.add_argument("--loop", action="store_true", help="keep running, sleeping between passes")
+    parser.add_argument("--sleep", type=int, default=LOOP_SLEEP, help="seconds between passes with --loop")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be removed")
+    parser.add_argument("--rescan", action="store_true", help="list every directory again")
+    parser.add_argument("--status", action="store_true", help="print usage, growth and budgets")
+    args = parser.parse_args()
+
+    db = open_db()
+    try:
+        if args.status:
+            refresh(db, args.rescan)
+            print_status(db)
+            return
+        while True:
+            run_once(db, args.dry_run, args.rescan)
+            args.rescan = False
+            if not args.loop:
+                break
+            time.sleep(args.sleep)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
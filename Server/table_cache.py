@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Per-process cache for lookup structures built from a database table.
+
+text_corrections.py and callsign_resolver.py both compile a table into an
+in-memory index. load_cached() re-runs the cheap fingerprint query on every
+call and only reloads the rows and rebuilds the index when the fingerprint
+changes.
+"""
+
+_cache = {}  # (fingerprint_sql, rows_sql) -> (fingerprint, built)
+
+def row_values(row):
+    # mysql.connector returns tuples, DictCursor/dictionary=True return dicts.
+    return tuple(row.values()) if isinstance(row, dict) else tuple(row)
+
+def load_cached(cursor, fingerprint_sql, rows_sql, build):
+    """build(rows) over rows_sql, reused while fingerprint_sql returns the same row."""
+    key = (fingerprint_sql, rows_sql)
+    cursor.execute(fingerprint_sql)
+    fingerprint = row_values(cursor.fetchone())
+    cached = _cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    cursor.execute(rows_sql)
+    built = build(row_values(row) for row in cursor.fetchall())
+    _cache[key] = (fingerprint, built)
+    return built
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Shared engine for the `corrections` table (detect -> correct).
+
+Entries are compiled into a token trie so multi-word keys such as
+"key local" match as well as single words, in one left-to-right pass
+that always takes the longest key starting at each token. Tokens are
+compared lowercased with punctuation stripped.
+
+Used by callsign_extractor.py and the AI_Scripts (Transcript_Analyzer.py,
+topic_extractor.py). load_corrections_trie() keeps one compiled trie per
+process and rebuilds it only when the table's contents change.
+"""
+
+import re
+import string
+
+from table_cache import load_cached
+
+_STRIP_PUNCT = str.maketrans('', '', string.punctuation)
+_END = object()
+
+# Row count plus an order-independent checksum of every entry.
+FINGERPRINT_SQL = (
+    "SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS(CHAR(0), `detect`, `correct`))), 0) "
+    "FROM corrections"
+)
+LOAD_SQL = "SELECT `detect`, `correct` FROM corrections"
+
+def normalize_token(token):
+    return token.lower().translate(_STRIP_PUNCT)
+
+class CorrectionsTrie:
+
+    def __init__(self, pairs=()):
+        self.root = {}
+        self.size = 0
+        for detect, correct in pairs:
+            self.add(detect, correct)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, detect, correct):
+        tokens = [t for t in (normalize_token(w) for w in (detect or "").split()) if t]
+        correct = (correct or "").strip()
+        if not tokens or not correct:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if _END not in node:
+            self.size += 1
+        node[_END] = correct
+
+    def match(self, tokens, start):
+        """Return (end, correct) of the longest key at tokens[start], or None."""
+        node = self.root
+        best = None
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if _END in node:
+                best = (i + 1, node[_END])
+        return best
+
+    def correct_tokens(self, tokens):
+        """Replace keys in a list of normalized tokens; returns a new list."""
+        out = []
+        i = 0
+        while i < len(tokens):
+            hit = self.match(tokens, i) if tokens[i] in self.root else None
+            if hit:
+                i, correct = hit
+                out.append(correct)
+            else:
+                out.append(tokens[i])
+                i += 1
+        return out
+
+    def apply(self, text):
+        """Lowercased, punctuation-free words with corrections applied."""
+        tokens = [normalize_token(w) for w in text.split()]
+        return ' '.join(t.lower() for t in self.correct_tokens(tokens))
+
+    def apply_preserving(self, text):
+        """
+        Replace keys inside `text`, leaving everything else (case, spacing,
+        punctuation around the match) as it was.
+        """
+        if not text or not self.root:
+            return text
+        words = list(re.finditer(r"\S+", text))
+        tokens = [normalize_token(m.group()) for m in words]
+        out = []
+        pos = 0
+        i = 0
+        while i < len(tokens):
+            hit = self.match(tokens, i) if tokens[i] in self.root else None
+            if not hit:
+                i += 1
+                continue
+            end, correct = hit
+            first, last = words[i], words[end - 1]
+            lead = re.match(r"[^\w]*", first.group()).group()
+            trail = re.search(r"[^\w]*$", last.group()).group()
+            out.append(text[pos:first.start()])
+            out.append(lead + correct + trail)
+            pos = last.end()
+            i = end
+        out.append(text[pos:])
+        return ''.join(out)
+
+def load_corrections_trie(cursor):
+    """Compiled trie for the current `corrections` table, cached per process."""
+    return load_cached(cursor, FINGERPRINT_SQL, LOAD_SQL, CorrectionsTrie)
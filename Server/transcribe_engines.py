@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Speech-to-text engines used by transcribe_worker.py.
+
+TRANSCRIBE_ENGINE picks the backend:
+
+  whisper         reference openai-whisper on torch (default)
+  faster-whisper  CTranslate2 port of the same models, quantized on CPU
+                  (CT2_COMPUTE_TYPE, default int8)
+  stub            no model, sleeps STUB_RTF x the audio length; used by
+                  ingest_benchmark.py to time the pipeline on its own
+
+Both take a WAV path or 16 kHz float32 samples and return plain text, so the
+worker writes their output to `transcriptions` the same way.
+transcribe_batch() takes a list of clips of up to 30 s each.
+"""
+
+import os
+import time
+import importlib.util
+
+TRANSCRIBE_ENGINE = os.getenv("TRANSCRIBE_ENGINE", "whisper")
+CT2_COMPUTE_TYPE = os.getenv("CT2_COMPUTE_TYPE", "int8")
+CT2_BEAM_SIZE = int(os.getenv("CT2_BEAM_SIZE", "5"))
+
+STUB_RTF = float(os.getenv("STUB_RTF", "0.05"))
+
+# Batched results that look like a bad greedy decode are redone through
+# transcribe(), which retries at higher temperatures (same limits as whisper).
+COMPRESSION_RATIO_LIMIT = 2.4
+LOGPROB_LIMIT = -1.0
+
+class WhisperEngine:
+    module = "whisper"
+    batches = True  # transcribe_batch() decodes the clips in one pass
+
+    def __init__(self, model_name, threads=None):
+        import whisper
+        if threads:
+            try:
+                import torch
+                torch.set_num_threads(threads)
+            except ImportError:
+                pass
+        self._whisper = whisper
+        self.model = whisper.load_model(model_name)
+
+    def transcribe(self, audio):
+        return self.model.transcribe(audio)["text"]
+
+    def transcribe_batch(self, clips):
+        """Decode clips as one padded 30 s mel batch."""
+        import torch
+        whisper = self._whisper
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(clip), self.model.dims.n_mels)
+            for clip in clips
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(
+            language=None if self.model.is_multilingual else "en",
+            without_timestamps=True,
+            fp16=self.model.device.type != "cpu"
+        )
+        texts = []
+        for clip, result in zip(clips, whisper.decode(self.model, mels, options)):
+            if result.compression_ratio > COMPRESSION_RATIO_LIMIT or result.avg_logprob < LOGPROB_LIMIT:
+                texts.append(self.transcribe(clip))
+            else:
+                texts.append(result.text)
+        return texts
+
+    def load_audio(self, path):
+        return self._whisper.load_audio(path)
+
+class FasterWhisperEngine:
+    module = "faster_whisper"
+    batches = False
+
+    def __init__(self, model_name, threads=None):
+        import faster_whisper
+        self._faster_whisper = faster_whisper
+        self.model = faster_whisper.WhisperModel(
+            model_name, device="cpu", compute_type=CT2_COMPUTE_TYPE,
+            cpu_threads=threads or 0
+        )
+
+    def transcribe(self, audio):
+        segments, _ = self.model.transcribe(audio, beam_size=CT2_BEAM_SIZE)
+        return "".join(s.text for s in segments)
+
+    def transcribe_batch(self, clips):
+        # faster-whisper only batches within one recording, so clips are
+        # decoded back to back on the already-warm model.
+        return [self.transcribe(clip) for clip in clips]
+
+    def load_audio(self, path):
+        return self._faster_whisper.decode_audio(path, sampling_rate=16000)
+
+class StubEngine:
+    module = None
+    batches = True  # so ingest_benchmark.py can time the batch path
+
+    def __init__(self, model_name, threads=None):
+        pass
+
+    def transcribe(self, audio):
+        if isinstance(audio, str):
+            from transcribe_scheduler import wav_duration
+            seconds = wav_duration(audio)
+        else:
+            seconds = len(audio) / 16000.0
+        time.sleep(seconds * STUB_RTF)
+        return ""
+
+    def transcribe_batch(self, clips):
+        return [self.transcribe(clip) for clip in clips]
+
+    def load_audio(self, path):
+        from audio_vad import read_pcm
+        return read_pcm(path)[0]
+
+ENGINES = {
+    "whisper": WhisperEngine,
+    "faster-whisper": FasterWhisperEngine,
+    "stub": StubEngine,
+}
+
+def engine_class(name=TRANSCRIBE_ENGINE):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown TRANSCRIBE_ENGINE {name!r}, expected one of {sorted(ENGINES)}")
+    return ENGINES[name]
+
+def engine_available(name=TRANSCRIBE_ENGINE):
+    module = engine_class(name).module
+    return module is None or importlib.util.find_spec(module) is not None
+
+def engine_batches(name=TRANSCRIBE_ENGINE):
+    """Whether batching short clips is faster than decoding them one by one."""
+    cls = ENGINES.get(name)
+    return cls is not None and cls.batches
+
+def load_engine(model_name, threads=None, name=TRANSCRIBE_ENGINE):
+    return engine_class(name)(model_name, threads)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Job ordering for transcribe_watcher.py.
+
+Pending WAVs are handed out shortest-first, using the duration in the WAV
+header, so a long rag-chew does not hold a queue of 3-second check-ins
+behind it. A file that has waited longer than MAX_WAIT seconds is handed out
+next regardless of length so long overs still get done during a busy net.
+
+When the backlog grows past BACKLOG_THRESHOLD the scheduler asks for the
+faster model tier until the queue has drained back below half of that.
+"""
+
+import os
+import time
+import wave
+import heapq
+import itertools
+from collections import deque
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "medium.en")
+FAST_WHISPER_MODEL = os.getenv("FAST_WHISPER_MODEL", "base.en")
+BACKLOG_THRESHOLD = int(os.getenv("BACKLOG_THRESHOLD", "20"))
+MAX_WAIT = int(os.getenv("MAX_WAIT", "600"))
+
+# 16 kHz, 16-bit mono; only used when the header cannot be read.
+FALLBACK_BYTES_PER_SEC = 32000
+
+def wav_duration(path):
+    """Duration in seconds from the WAV header, or an estimate from size."""
+    try:
+        with wave.open(path, "rb") as w:
+            rate = w.getframerate()
+            if rate > 0:
+                return w.getnframes() / float(rate)
+    except (wave.Error, EOFError, OSError):
+        pass
+    try:
+        return os.path.getsize(path) / float(FALLBACK_BYTES_PER_SEC)
+    except OSError:
+        return 0.0
+
+class JobScheduler:
+    """Shortest-job-first queue of WAV names with an age cap."""
+
+    def __init__(self, directory, max_wait=MAX_WAIT):
+        self.directory = directory
+        self.max_wait = max_wait
+        self._heap = []
+        self._arrivals = deque()
+        self._queued = {}
+        self._seq = itertools.count()
+        self._fast = False
+
+    def __len__(self):
+        return len(self._queued)
+
+    def __contains__(self, name):
+        return name in self._queued
+
+    def add(self, names):
+        now = time.time()
+        for name in names:
+            if name in self._queued:
+                continue
+            duration = wav_duration(os.path.join(self.directory, name))
+            entry = (duration, next(self._seq), name, now)
+            self._queued[name] = entry
+            heapq.heappush(self._heap, entry)
+            self._arrivals.append(entry)
+
+    def _next_entry(self):
+        self._drop_stale()
+        if not self._queued:
+            return None
+        oldest = self._arrivals[0]
+        if time.time() - oldest[3] > self.max_wait:
+            return oldest
+        return self._heap[0]
+
+    def peek_duration(self):
+        """
+        Duration of the job pop() would return, 0 if that job is overdue,
+        or None when empty. Used to interleave split-file segments.
+        """
+        entry = self._next_entry()
+        if entry is None:
+            return None
+        if time.time() - entry[3] > self.max_wait:
+            return 0.0
+        return entry[0]
+
+    def pop(self):
+        """Return (name, duration) of the next job, or None when empty."""
+        entry = self._next_entry()
+        if entry is None:
+            return None
+        del self._queued[entry[2]]
+        self._drop_stale()
+        return entry[2], entry[0]
+
+    def _drop_stale(self):
+        # Entries are removed from _queued first and lazily from the rest.
+        while self._heap and self._queued.get(self._heap[0][2]) is not self._heap[0]:
+            heapq.heappop(self._heap)
+        while self._arrivals and self._queued.get(self._arrivals[0][2]) is not self._arrivals[0]:
+            self._arrivals.popleft()
+
+    def model_for_backlog(self):
+        """Pick the model tier for the next job based on queue depth."""
+        depth = len(self._queued)
+        if not self._fast and depth > BACKLOG_THRESHOLD:
+            self._fast = True
+            print(f"[INFO] Backlog of {depth} files, switching to {FAST_WHISPER_MODEL}.")
+        elif self._fast and depth < BACKLOG_THRESHOLD // 2:
+            self._fast = False
+            print(f"[INFO] Backlog cleared, switching back to {WHISPER_MODEL}.")
+        return FAST_WHISPER_MODEL if self._fast else WHISPER_MODEL
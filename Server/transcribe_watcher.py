@@ -1,53 +1,571 @@
 #!/usr/bin/env python3
 import os
 import time
+import sqlite3
 import subprocess
+from collections import deque
 
-WATCH_DIR = "DIRECTORY_PATH/incoming"
-PROCESSED_DIR = "DIRECTORY_PATH/processed"
-ERROR_DIR = "DIRECTORY_PATH/failed"
-TRANSCRIBE_SCRIPT = "DIRECTORY_PATH/transcribe_and_log.py"
+from transcribe_scheduler import JobScheduler
+from audio_dedupe import DedupeIndex, pcm_digest
+from ingest_journal import IngestJournal
+from transcribe_engines import TRANSCRIBE_ENGINE, engine_available, engine_batches
+from transcribe_worker import (WorkerPool, default_worker_count, get_mysql_connection,
+                               log_screening, log_split_transcription, log_duplicate,
+                               find_transcription_id)
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+try:
+    import audio_vad
+except ImportError:
+    audio_vad = None
+
+BASE_DIR = os.getenv("TRANSCRIBE_DIR", "DIRECTORY_PATH")
+WATCH_DIR = os.path.join(BASE_DIR, "incoming")
+PROCESSED_DIR = os.path.join(BASE_DIR, "processed")
+ERROR_DIR = os.path.join(BASE_DIR, "failed")
+SKIP_DIR = os.path.join(BASE_DIR, "skipped")
+TRANSCRIBE_SCRIPT = os.getenv("TRANSCRIBE_SCRIPT", "DIRECTORY_PATH/transcribe_and_log.py")
+# Local SQLite file holding the job journal and the dedupe index.
+STATE_DB = os.path.join(BASE_DIR, "ingest_state.sqlite3")
+
+# "pool" keeps Whisper loaded in long-lived worker processes (see
+# transcribe_worker.py). "subprocess" runs TRANSCRIBE_SCRIPT once per file.
+TRANSCRIBE_MODE = os.getenv("TRANSCRIBE_MODE", "pool")
+# 0 sizes the pool to the core count (see transcribe_worker.WORKER_THREADS).
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "0"))
+JOB_TIMEOUT = 1500
+POLL_INTERVAL = 5
+
+# "inotify" reacts to close_write/moved_to events (push-taas-wavs.sh uploads
+# to .part and renames), "poll" rescans WATCH_DIR every POLL_INTERVAL.
+WATCH_BACKEND = os.getenv("WATCH_BACKEND", "inotify")
+
+# Classify files with audio_vad before transcribing; silence and tones go to
+# SKIP_DIR instead of Whisper. Needs numpy.
+VAD_ENABLE = os.getenv("VAD_ENABLE", "1") == "1"
+
+# In pool mode, files longer than SPLIT_MIN_SEC are cut at pauses into
+# roughly SEGMENT_SEC slices that are decoded in parallel and stitched back
+# into one transcription. 0 disables splitting.
+SPLIT_MIN_SEC = float(os.getenv("SPLIT_MIN_SEC", "120"))
+SEGMENT_SEC = float(os.getenv("SEGMENT_SEC", "30"))
+
+# In pool mode, files up to BATCH_MAX_SEC are held for at most BATCH_WINDOW
+# seconds so up to BATCH_SIZE of them can be decoded as one batch. Whisper
+# pads every clip to 30 s, so longer files are never batched. 1 disables.
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+BATCH_MAX_SEC = min(float(os.getenv("BATCH_MAX_SEC", "15")), 30.0)
+BATCH_WINDOW = float(os.getenv("BATCH_WINDOW", "0.75"))
+# Engines whose transcribe_batch() is a plain loop only add latency when batched.
+if not engine_batches(TRANSCRIBE_ENGINE):
+    BATCH_SIZE = 1
+
+# Hash the PCM of each file and link repeats to the existing transcription
+# instead of decoding them again (see audio_dedupe.py).
+DEDUPE_ENABLE = os.getenv("DEDUPE_ENABLE", "1") == "1"
 
 # Ensure output directories exist
 os.makedirs(PROCESSED_DIR, exist_ok=True)
 os.makedirs(ERROR_DIR, exist_ok=True)
+os.makedirs(SKIP_DIR, exist_ok=True)
+
+_db = None
+_journal = IngestJournal(STATE_DB)
+_dedupe = DedupeIndex(STATE_DB) if DEDUPE_ENABLE else None
+# original filename -> copies waiting for its transcription to finish
+_deferred = {}
 
 def is_valid_audio(file_path):
     return os.path.isfile(file_path) and os.path.getsize(file_path) > 1000
 
-while True:
-    files = [f for f in os.listdir(WATCH_DIR) if f.lower().endswith(".wav")]
-    for f in files:
-        full_path = os.path.join(WATCH_DIR, f)
+def move_to(full_path, dest_dir):
+    os.rename(full_path, os.path.join(dest_dir, os.path.basename(full_path)))
 
-        if not is_valid_audio(full_path):
-            print(f"[SKIP] {f} is invalid or empty.")
-            continue
+def watcher_db():
+    global _db
+    if _db is None:
+        _db = get_mysql_connection()
+    else:
+        _db.ping(reconnect=True, attempts=3, delay=1)
+    return _db
+
+def lookup_transcription_id(f):
+    try:
+        return find_transcription_id(watcher_db(), f)
+    except Exception as e:
+        print(f"[WARN] Could not look up transcription id for {f}: {e}")
+        return None
+
+def admit(pending, names):
+    """Journal newly seen files and schedule the ones that are ready."""
+    pending.add(_journal.enqueue(names))
+
+def fail_file(full_path, detail, retry=True):
+    """Schedule a retry, or move the file to ERROR_DIR once out of attempts."""
+    f = os.path.basename(full_path)
+    delay = _journal.fail(f, str(detail)[-2000:], retry)
+    if delay is None:
+        move_to(full_path, ERROR_DIR)
+    else:
+        print(f"[RETRY] {f} will be retried in {delay}s.")
+
+def record_screening(f, result, action):
+    try:
+        log_screening(watcher_db(), f, result, action)
+    except Exception as e:
+        print(f"[WARN] Could not record screening for {f}: {e}")
+
+def screen_audio(full_path):
+    """Return True if the file should be transcribed, else move it to SKIP_DIR."""
+    if not VAD_ENABLE or audio_vad is None:
+        return True
+
+    f = os.path.basename(full_path)
+    if _journal.attempts(f):
+        return True  # a retry: screened as speech on its first attempt, already recorded
+    try:
+        result = audio_vad.classify_wav(full_path)
+    except Exception as e:
+        print(f"[WARN] VAD failed on {f}: {e}, transcribing anyway.")
+        return True
+
+    if result.label == "speech":
+        record_screening(f, result, "transcribe")
+        return True
+
+    print(f"[SKIP] {f} classified as {result.label} ({result.active_sec:.1f}s active), moving to skipped.")
+    move_to(full_path, SKIP_DIR)
+    record_screening(f, result, "skipped")
+    _journal.skip(f, result.label)
+    return False
+
+def check_duplicate(full_path, in_progress=()):
+    """
+    Return "new" if the file should be transcribed, "duplicate" if it was
+    linked to an existing transcription and moved to SKIP_DIR, or "wait" if
+    the same audio is still being decoded under another name.
+    """
+    if _dedupe is None:
+        return "new"
 
-        print(f"[INFO] Processing {f}")
+    f = os.path.basename(full_path)
+    try:
+        digest = pcm_digest(full_path)
+        known = _dedupe.lookup(digest)
+        if known is None or (known[0] == f and known[1] is None):
+            _dedupe.claim(digest, f)
+            return "new"
+
+        original, transcription_id = known
+        if transcription_id is None:
+            if original in in_progress:
+                _deferred.setdefault(original, set()).add(f)
+                return "wait"
+            # Left over from a crash; see whether the original made it in.
+            transcription_id = find_transcription_id(watcher_db(), original)
+            if transcription_id is None:
+                _dedupe.claim(digest, f)
+                return "new"
+            _dedupe.resolve(original, transcription_id)
+    except Exception as e:
+        print(f"[WARN] Duplicate check failed on {f}: {e}, transcribing anyway.")
+        return "new"
+
+    print(f"[DUPLICATE] {f} matches {original} (transcription {transcription_id}), moving to skipped.")
+    try:
+        log_duplicate(watcher_db(), f, transcription_id, digest)
+    except Exception as e:
+        print(f"[WARN] Could not record duplicate {f}: {e}")
+    move_to(full_path, SKIP_DIR)
+    _journal.skip(f, "duplicate", transcription_id)
+    return "duplicate"
+
+def record_outcome(f, transcription_id=None):
+    """
+    Update the dedupe index once a file is finished (transcription_id None
+    means it failed) and return copies of it that were waiting.
+    """
+    if _dedupe is not None:
         try:
-            result = subprocess.run(
-                ["python3", TRANSCRIBE_SCRIPT, full_path],
-                check=True,
-                timeout=1500,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            print(f"[SUCCESS] {f} processed.")
-            os.rename(full_path, os.path.join(PROCESSED_DIR, f))
-
-        except subprocess.TimeoutExpired:
-            print(f"[TIMEOUT] {f} took too long, moving to failed.")
-            os.rename(full_path, os.path.join(ERROR_DIR, f))
+            if transcription_id is not None:
+                _dedupe.resolve(f, transcription_id)
+            else:
+                _dedupe.forget(f)
+        except sqlite3.Error as e:
+            print(f"[WARN] Could not update dedupe index for {f}: {e}")
+    return _deferred.pop(f, set())
+
+def list_pending():
+    return sorted(f for f in os.listdir(WATCH_DIR) if f.lower().endswith(".wav"))
+
+# ----------------------------
+# Directory watchers
+# ----------------------------
+
+class PollingWatcher:
+    """Rescans WATCH_DIR at most every POLL_INTERVAL; the original behaviour."""
+
+    def __init__(self):
+        self._last_scan = 0
+
+    def sweep(self):
+        self._last_scan = time.time()
+        return list_pending()
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        if time.time() - self._last_scan < POLL_INTERVAL:
+            return []
+        return self.sweep()
+
+class InotifyWatcher:
+    """
+    Returns WAVs as they are completed in WATCH_DIR. The watch is added
+    before the startup sweep so nothing that lands in between is missed.
+    """
+
+    def __init__(self):
+        self._inotify = INotify()
+        self._inotify.add_watch(WATCH_DIR, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+
+    def sweep(self):
+        return list_pending()
+
+    def wait(self, timeout):
+        names = []
+        for event in self._inotify.read(timeout=int(timeout * 1000)):
+            if event.mask & inotify_flags.Q_OVERFLOW:
+                print("[WARN] inotify queue overflowed, rescanning.")
+                return self.sweep()
+            if event.name.lower().endswith(".wav"):
+                names.append(event.name)
+        return names
+
+def make_watcher():
+    if WATCH_BACKEND == "inotify":
+        if INotify is not None:
+            return InotifyWatcher()
+        print("[WARN] inotify_simple is not installed, falling back to polling.")
+    return PollingWatcher()
+
+# ----------------------------
+# Per-file subprocess mode
+# ----------------------------
+
+def check_file(full_path):
+    f = os.path.basename(full_path)
+    if not os.path.exists(full_path):
+        _journal.skip(f, "missing")
+        return False
+    if not is_valid_audio(full_path):
+        print(f"[SKIP] {f} is invalid or empty.")
+        # Left in WATCH_DIR; the next sweep re-queues it if it was still being written.
+        _journal.skip(f, "invalid")
+        return False
+    return True
+
+def process_with_subprocess(f, duration=None):
+    full_path = os.path.join(WATCH_DIR, f)
+
+    if not check_file(full_path):
+        return
+
+    if not screen_audio(full_path):
+        return
 
-        except subprocess.CalledProcessError as e:
+    if check_duplicate(full_path) != "new":
+        return
+
+    print(f"[INFO] Processing {f}")
+    _journal.start(f, duration)
+    started = time.time()
+    try:
+        result = subprocess.run(
+            ["python3", TRANSCRIBE_SCRIPT, full_path],
+            check=True,
+            timeout=JOB_TIMEOUT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        print(f"[SUCCESS] {f} processed.")
+        move_to(full_path, PROCESSED_DIR)
+        transcription_id = lookup_transcription_id(f)
+        _journal.done(f, transcription_id, time.time() - started)
+        record_outcome(f, transcription_id)
+        return
+
+    except subprocess.TimeoutExpired:
+        print(f"[TIMEOUT] {f} took too long, moving to failed.")
+        fail_file(full_path, "timeout", retry=False)
+
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode(errors='ignore') if e.stderr else "(empty)"
+        print(f"[ERROR] Failed to process {f}")
+        print("  STDOUT:", e.stdout.decode(errors='ignore') if e.stdout else "(empty)")
+        print("  STDERR:", stderr)
+        fail_file(full_path, stderr)
+
+    except Exception as e:
+        print(f"[UNEXPECTED] Error with {f}: {e}")
+        fail_file(full_path, e)
+
+    record_outcome(f)
+
+def run_subprocess_mode(watcher):
+    pending = JobScheduler(WATCH_DIR)
+    admit(pending, _journal.recover())
+    admit(pending, watcher.sweep())
+    while True:
+        while pending:
+            f, duration = pending.pop()
+            process_with_subprocess(f, duration)
+        admit(pending, watcher.wait(POLL_INTERVAL))
+        admit(pending, _journal.due_retries())
+
+# ----------------------------
+# Worker pool mode
+# ----------------------------
+
+def handle_result(result):
+    """Move a finished file and return copies that were waiting on it."""
+    f = os.path.basename(result.path)
+    try:
+        if result.ok:
+            print(f"[SUCCESS] {f} processed in {result.elapsed:.1f}s.")
+            move_to(result.path, PROCESSED_DIR)
+            _journal.done(f, result.transcription_id, result.elapsed)
+            return record_outcome(f, result.transcription_id)
+        elif result.detail == "timeout":
+            print(f"[TIMEOUT] {f} took too long, moving to failed.")
+            fail_file(result.path, "timeout", retry=False)
+        else:
             print(f"[ERROR] Failed to process {f}")
-            print("  STDOUT:", e.stdout.decode(errors='ignore') if e.stdout else "(empty)")
-            print("  STDERR:", e.stderr.decode(errors='ignore') if e.stderr else "(empty)")
-            os.rename(full_path, os.path.join(ERROR_DIR, f))
+            print("  DETAIL:", result.detail)
+            fail_file(result.path, result.detail)
+    except Exception as e:
+        print(f"[UNEXPECTED] Error with {f}: {e}")
+    return record_outcome(f)
+
+class SplitFile:
+    """Slices of one long recording that are being decoded in parallel."""
+
+    def __init__(self, path, spans):
+        self.path = path
+        self.spans = spans
+        self.texts = [None] * len(spans)
+        self.outstanding = len(spans)
+        self.error = None
+        self.started = time.time()
+
+def plan_split(full_path, duration, pool):
+    """Return silence-cut (start, end) spans, or None to decode whole."""
+    if not SPLIT_MIN_SEC or duration < SPLIT_MIN_SEC or pool.size < 2 or audio_vad is None:
+        return None
+    try:
+        samples, rate = audio_vad.read_pcm(full_path)
+        spans = audio_vad.split_at_silence(samples, rate, SEGMENT_SEC)
+    except Exception as e:
+        print(f"[WARN] Could not split {os.path.basename(full_path)}: {e}")
+        return None
+    return spans if len(spans) > 1 else None
+
+def handle_slice_result(result, splits, slices):
+    split = splits[result.path]
+    f = os.path.basename(result.path)
+    split.outstanding -= 1
+    if result.ok:
+        split.texts[int(result.key.rsplit("#", 1)[1])] = result.text
+    elif split.error is None:
+        split.error = result.detail
+        # No point decoding the rest of a file that has already failed.
+        queued = [s for s in slices if s[0] == result.path]
+        for s in queued:
+            slices.remove(s)
+        split.outstanding -= len(queued)
+
+    if split.outstanding > 0:
+        return set()
+    del splits[result.path]
+
+    try:
+        if split.error is not None:
+            print(f"[ERROR] Failed to process {f} (split into {len(split.spans)} slices)")
+            print("  DETAIL:", split.error)
+            fail_file(result.path, split.error, retry=split.error != "timeout")
+            return record_outcome(f)
+        parts = [(start, end, text) for (start, end), text in zip(split.spans, split.texts)]
+        transcription_id = log_split_transcription(watcher_db(), f, parts)
+        elapsed = time.time() - split.started
+        print(f"[SUCCESS] {f} processed in {elapsed:.1f}s ({len(parts)} slices).")
+        move_to(result.path, PROCESSED_DIR)
+        _journal.done(f, transcription_id, elapsed)
+        return record_outcome(f, transcription_id)
+    except Exception as e:
+        print(f"[UNEXPECTED] Error with {f}: {e}")
+        fail_file(result.path, e)
+        return record_outcome(f)
+
+class ClipBatch:
+    """Short files held back briefly so one worker can decode them together."""
+
+    def __init__(self):
+        self.paths = []
+        self.model_name = None
+        self.opened = None
+        self.capacity = BATCH_SIZE
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __contains__(self, path):
+        return path in self.paths
+
+    def fits(self, duration, model_name):
+        if not self.paths:
+            return BATCH_SIZE > 1 and duration <= BATCH_MAX_SEC
+        return (duration <= BATCH_MAX_SEC and model_name == self.model_name
+                and len(self.paths) < self.capacity)
+
+    def add(self, path, model_name, capacity=None):
+        if not self.paths:
+            self.model_name = model_name
+            self.opened = time.time()
+            self.capacity = capacity or BATCH_SIZE
+        self.paths.append(path)
 
-        except Exception as e:
-            print(f"[UNEXPECTED] Error with {f}: {e}")
-            os.rename(full_path, os.path.join(ERROR_DIR, f))
+    def due(self):
+        return len(self.paths) >= self.capacity or self.remaining() == 0
 
-    time.sleep(5)
+    def remaining(self):
+        return max(0.0, self.opened + BATCH_WINDOW - time.time())
+
+    def flush(self, pool):
+        if len(self.paths) == 1:
+            pool.submit(self.paths[0], self.model_name)
+        elif self.paths:
+            print(f"[INFO] Decoding {len(self.paths)} clips as one batch ({self.model_name})")
+            pool.submit_batch(self.paths, self.model_name)
+        self.paths = []
+
+def batch_capacity(pool, pending):
+    """
+    Clips a new batch should take: 1 (no batch) while the free workers can
+    take every waiting file on their own, otherwise the backlog spread
+    evenly over the free workers, up to BATCH_SIZE.
+    """
+    if BATCH_SIZE <= 1:
+        return 1
+    backlog = len(pending) + 1
+    return min(BATCH_SIZE, -(-backlog // max(pool.free_slots(), 1)))
+
+def dispatch(pool, pending, splits, slices, batch):
+    """Fill free worker slots, shortest job first across files and slices."""
+    while pending or slices:
+        # An open batch has a worker set aside for it.
+        free = pool.free_slots() - (1 if batch else 0)
+        next_file = pending.peek_duration()
+        if free <= 0:
+            # Overdue files (peek 0) wait for a real slot, not the batch.
+            if not (batch and next_file and batch.fits(next_file, pending.model_for_backlog())):
+                break
+        elif slices and (next_file is None or slices[0][3] <= next_file):
+            path, seq, model_name, duration, span = slices.popleft()
+            pool.submit(path, model_name, span, seq)
+            continue
+
+        model_name = pending.model_for_backlog()
+        f, duration = pending.pop()
+        full_path = os.path.join(WATCH_DIR, f)
+        if full_path in pool.in_flight or full_path in splits or full_path in batch:
+            continue
+        if not check_file(full_path):
+            continue
+        if not screen_audio(full_path):
+            continue
+        in_progress = {os.path.basename(st["path"]) for st in pool.in_flight.values()}
+        in_progress.update(os.path.basename(p) for p in splits)
+        in_progress.update(os.path.basename(p) for p in batch.paths)
+        if check_duplicate(full_path, in_progress) != "new":
+            continue
+
+        spans = plan_split(full_path, duration, pool)
+        if spans:
+            print(f"[INFO] Processing {f} ({duration:.1f}s, {model_name}) "
+                  f"as {len(spans)} slices")
+            splits[full_path] = SplitFile(full_path, spans)
+            _journal.start(f, duration)
+            for seq, span in enumerate(spans):
+                slices.append((full_path, seq, model_name, span[1] - span[0], span))
+            continue
+
+        print(f"[INFO] Processing {f} ({duration:.1f}s, {model_name})")
+        _journal.start(f, duration)
+        if batch and batch.fits(duration, model_name):
+            batch.add(full_path, model_name)
+        elif duration <= BATCH_MAX_SEC and BATCH_SIZE > 1:
+            # Model tier changed or the batch is full: send it, and only start
+            # a new one when there are more files waiting than free workers.
+            batch.flush(pool)
+            capacity = batch_capacity(pool, pending)
+            if capacity > 1:
+                batch.add(full_path, model_name, capacity)
+            else:
+                pool.submit(full_path, model_name)
+        else:
+            pool.submit(full_path, model_name)
+
+        if batch and batch.due():
+            batch.flush(pool)
+
+    if batch and batch.due():
+        batch.flush(pool)
+
+def run_pool_mode(watcher):
+    size = WORKER_COUNT or default_worker_count()
+    pool = WorkerPool(size, timeout=JOB_TIMEOUT)
+    pool.start()
+    print(f"[INFO] Started {size} {TRANSCRIBE_ENGINE} workers ({pool.model_name}).")
+    pending = JobScheduler(WATCH_DIR)
+    admit(pending, _journal.recover())
+    admit(pending, watcher.sweep())
+    splits = {}
+    slices = deque()
+    batch = ClipBatch()
+    try:
+        while True:
+            dispatch(pool, pending, splits, slices, batch)
+
+            if pool.in_flight:
+                # Keep an eye on both the workers and the directory.
+                timeout = min(0.5, batch.remaining()) if batch else 0.5
+                for result in pool.collect(timeout=timeout):
+                    if result.key == result.path:
+                        admit(pending, handle_result(result))
+                    else:
+                        admit(pending, handle_slice_result(result, splits, slices))
+                admit(pending, watcher.wait(0))
+            else:
+                admit(pending, watcher.wait(batch.remaining() if batch else POLL_INTERVAL))
+            admit(pending, _journal.due_retries())
+    finally:
+        pool.stop()
+
+if __name__ == "__main__":
+    if TRANSCRIBE_MODE == "pool" and not engine_available():
+        print(f"[WARN] {TRANSCRIBE_ENGINE} is not importable here, falling back to subprocess mode.")
+        TRANSCRIBE_MODE = "subprocess"
+
+    watcher = make_watcher()
+    if TRANSCRIBE_MODE == "pool":
+        try:
+            run_pool_mode(watcher)
+        except RuntimeError as e:
+            print(f"[WARN] {e}")
+            print("[WARN] Worker pool unavailable, falling back to subprocess mode.")
+            run_subprocess_mode(watcher)
+    else:
+        run_subprocess_mode(watcher)
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+Long-lived Whisper workers for transcribe_watcher.py.
+
+Each worker process loads the model once (through the engine selected by
+TRANSCRIBE_ENGINE, see transcribe_engines.py) and then takes WAV paths from a
+shared job queue, so a PTT burst costs one decode instead of an interpreter
+start plus a full model load. Results go into `transcriptions` the same way
+transcribe_and_log.py writes them.
+
+Jobs name the model to use, so the watcher can switch to a faster tier
+during a backlog; each worker keeps every model it has loaded.
+
+Short files can be sent as one batch job; the engine decodes them in a
+single padded pass and each still gets its own `transcriptions` row.
+
+A job can also cover only a (start, end) slice of a file. Slices are not
+written to the database; their text is returned so the watcher can stitch
+a split recording back into one row (see log_split_transcription).
+
+Archived clips are sent as sources instead of paths: a byte range of a day
+zip, read by the worker itself, or the encoded bytes. Their text is also
+returned rather than written (see retranscribe_archive.py).
+"""
+
+import os
+import time
+import wave
+import queue
+import signal
+import subprocess
+import itertools
+import traceback
+import multiprocessing as mp
+from collections import namedtuple
+from datetime import datetime
+
+try:
+    import mysql.connector
+except ImportError:
+    mysql = None
+
+# ----------------------------
+# Config
+# ----------------------------
+
+DB_CONFIG = {
+    'host': 'HOSTNAME / IP',
+    'user': 'USER',
+    'password': 'PASSWORD',
+    'database': 'DATABASE'
+}
+
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "medium.en")
+# "none" accepts and discards every write, for timing the pipeline without a
+# database (see ingest_benchmark.py).
+TRANSCRIBE_DB = os.getenv("TRANSCRIBE_DB", "mysql")
+
+# Engine threads per worker (torch or CTranslate2); WORKER_COUNT defaults to cores / WORKER_THREADS.
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "2"))
+
+# key is the path for whole files and "<path>#<n>" for slices; text is only
+# set for slices and transcription_id only for whole files.
+JobResult = namedtuple("JobResult", "key path ok detail elapsed text transcription_id")
+
+# ----------------------------
+# Database Helpers
+# ----------------------------
+
+class NullConnection:
+    """Connection and cursor in one that drops every write (TRANSCRIBE_DB=none)."""
+
+    _ids = itertools.count(1)
+    lastrowid = None
+
+    def cursor(self, *args, **kwargs):
+        return self
+
+    def execute(self, query, params=None):
+        self.lastrowid = next(self._ids)
+
+    def executemany(self, query, seq):
+        pass
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+    def ping(self, **kwargs):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+def get_mysql_connection():
+    if TRANSCRIBE_DB == "none":
+        return NullConnection()
+    if mysql is None:
+        raise RuntimeError("mysql-connector-python is not installed; set TRANSCRIBE_DB=none to run without a database")
+    return mysql.connector.connect(**DB_CONFIG)
+
+def insert_transcription(cursor, basename, transcript):
+    cursor.execute("""
+        INSERT INTO transcriptions (filename, timestamp, transcription)
+        VALUES (%s, %s, %s)
+    """, (basename, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), transcript))
+    return cursor.lastrowid
+
+def log_transcription(conn, basename, transcript):
+    cursor = conn.cursor()
+    transcription_id = insert_transcription(cursor, basename, transcript)
+    conn.commit()
+    cursor.close()
+    return transcription_id
+
+def log_split_transcription(conn, basename, parts):
+    """
+    Write a recording decoded in slices as one transcriptions row, keeping
+    each slice's offsets in transcription_segments. parts is a list of
+    (start_s, end_s, text) in order.
+    """
+    cursor = conn.cursor()
+    text = " ".join(t.strip() for _, _, t in parts if t and t.strip())
+    transcription_id = insert_transcription(cursor, basename, text)
+    cursor.executemany("""
+        INSERT INTO transcription_segments (transcription_id, seq, start_s, end_s, text)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(transcription_id, i, round(start, 3), round(end, 3), t.strip())
+          for i, (start, end, t) in enumerate(parts)])
+    conn.commit()
+    cursor.close()
+    return transcription_id
+
+def log_screening(conn, basename, result, action):
+    """Record an audio_vad decision in audio_screening."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO audio_screening
+            (filename, classification, action, duration_s, active_s, rms_dbfs, peak_ratio, flatness)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (basename, result.label, action, round(result.duration, 3), round(result.active_sec, 3),
+          round(result.rms_dbfs, 2), round(result.peak_ratio, 4), round(result.flatness, 4)))
+    conn.commit()
+    cursor.close()
+
+def log_duplicate(conn, basename, transcription_id, digest):
+    """Link a WAV whose audio was already transcribed to the existing row."""
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO transcription_duplicates (filename, transcription_id, content_hash)
+        VALUES (%s, %s, %s)
+    """, (basename, transcription_id, digest))
+    conn.commit()
+    cursor.close()
+
+def find_transcription_id(conn, basename):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id FROM transcriptions WHERE filename = %s ORDER BY id DESC LIMIT 1",
+        (basename,)
+    )
+    row = cursor.fetchone()
+    cursor.close()
+    return row[0] if row else None
+
+# ----------------------------
+# Worker Process
+# ----------------------------
+
+def default_worker_count():
+    return max(1, (os.cpu_count() or 2) // WORKER_THREADS)
+
+def load_model(model_name):
+    from transcribe_engines import load_engine
+    return load_engine(model_name, threads=WORKER_THREADS)
+
+def load_clip(engine, path, start=None, end=None):
+    """16 kHz float32 samples for a WAV, or for [start, end) seconds of it."""
+    from audio_vad import read_pcm
+    try:
+        samples, rate = read_pcm(path, start, end)
+    except (wave.Error, EOFError, ValueError):
+        # Not plain PCM (mu-law, GSM, 24-bit...): let the engine decode it through ffmpeg.
+        samples, rate = None, None
+    if rate != 16000:
+        samples = engine.load_audio(path)
+        if start is not None:
+            samples = samples[int(start * 16000):int(end * 16000)]
+    return samples
+
+def read_source(source):
+    """Encoded audio for ("range", path, offset, length) or ("bytes", data)."""
+    if source[0] == "bytes":
+        return source[1]
+    _, path, offset, length = source
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.pread(fd, length, offset)
+    finally:
+        os.close(fd)
+
+def decode_audio_bytes(data):
+    """16 kHz mono float32 samples for encoded audio (MP3, WAV...), decoded through an ffmpeg pipe."""
+    import numpy as np
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-ar", "16000", "pipe:1"],
+        input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg exit {result.returncode}: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+def ensure_connection(conn):
+    if conn is None:
+        return get_mysql_connection()
+    conn.ping(reconnect=True, attempts=3, delay=1)
+    return conn
+
+def run_clip_batch(engine, paths, results, pid, conn):
+    """
+    Decode several short files in one batched pass and log each to its own
+    `transcriptions` row. Returns the (possibly new) DB connection.
+    """
+    started = time.time()
+    loaded, clips = [], []
+    for path in paths:
+        try:
+            clips.append(load_clip(engine, path))
+            loaded.append(path)
+        except Exception:
+            results.put(("error", pid, path, traceback.format_exc()))
+    if not loaded:
+        return conn
+
+    try:
+        texts = engine.transcribe_batch(clips)
+        conn = ensure_connection(conn)
+    except Exception:
+        detail = traceback.format_exc()
+        for path in loaded:
+            results.put(("error", pid, path, detail))
+        return conn
+
+    # Each clip is charged its share of the batch so RTF stays comparable.
+    elapsed = (time.time() - started) / len(loaded)
+    for path, text in zip(loaded, texts):
+        try:
+            transcription_id = log_transcription(conn, os.path.basename(path), text)
+            results.put(("done", pid, path, (elapsed, None, transcription_id)))
+        except Exception:
+            results.put(("error", pid, path, traceback.format_exc()))
+    return conn
+
+def run_source_batch(engine, items, results, pid, max_sec):
+    """
+    Decode archived clips given as (key, source) and return their text.
+    Clips up to max_sec go through one batched pass, longer ones one by one.
+    """
+    started = time.time()
+    short, long_ = [], []
+    for key, source in items:
+        try:
+            samples = decode_audio_bytes(read_source(source))
+        except Exception:
+            results.put(("error", pid, key, traceback.format_exc()))
+            continue
+        (short if len(samples) <= max_sec * 16000 else long_).append((key, samples))
+
+    done = []
+    if len(short) > 1:
+        try:
+            done.extend(zip([k for k, _ in short], engine.transcribe_batch([c for _, c in short])))
+            short = []
+        except Exception:
+            pass  # fall back to one at a time
+    for key, samples in short + long_:
+        try:
+            done.append((key, engine.transcribe(samples)))
+        except Exception:
+            results.put(("error", pid, key, traceback.format_exc()))
+    elapsed = (time.time() - started) / max(len(done), 1)
+    for key, text in done:
+        results.put(("done", pid, key, (elapsed, text, None)))
+
+def worker_loop(jobs, results, model_name):
+    """
+    Body of one worker process. Messages sent back to the parent are
+    (kind, pid, path, payload) tuples where kind is start/done/error/fatal.
+
+    Jobs are (key, path, model, span) for one file or slice,
+    ("batch", paths, model) for short files decoded together, or
+    ("sources", items, model, max_sec) for archived clips.
+    """
+    # Ctrl-C is handled by the watcher, which shuts the pool down cleanly.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    pid = os.getpid()
+
+    models = {}
+    try:
+        models[model_name] = load_model(model_name)
+    except Exception:
+        results.put(("fatal", pid, None, traceback.format_exc()))
+        return
+
+    conn = None
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+
+        # Claim every key at once, and only here, so the pool knows which
+        # worker holds the job even if it dies while loading a model, and
+        # JOB_TIMEOUT runs from the claim.
+        if job[0] == "sources":
+            keys = [key for key, _ in job[1]]
+        elif job[0] == "batch":
+            keys = job[1]
+        else:
+            keys = [job[0]]
+        claimed = time.time()
+        for key in keys:
+            results.put(("start", pid, key, claimed))
+
+        if job[0] == "sources":
+            _, items, job_model, max_sec = job
+            try:
+                if job_model not in models:
+                    models[job_model] = load_model(job_model)
+            except Exception:
+                detail = traceback.format_exc()
+                for key, _ in items:
+                    results.put(("error", pid, key, detail))
+                continue
+            run_source_batch(models[job_model], items, results, pid, max_sec)
+            continue
+
+        if job[0] == "batch":
+            _, paths, job_model = job
+            try:
+                if job_model not in models:
+                    models[job_model] = load_model(job_model)
+            except Exception:
+                detail = traceback.format_exc()
+                for path in paths:
+                    results.put(("error", pid, path, detail))
+                continue
+            conn = run_clip_batch(models[job_model], paths, results, pid, conn)
+            continue
+
+        key, path, job_model, span = job
+        started = time.time()
+        try:
+            if job_model not in models:
+                models[job_model] = load_model(job_model)
+            engine = models[job_model]
+            if span is not None:
+                audio = load_clip(engine, path, *span)
+                text = engine.transcribe(audio)
+                results.put(("done", pid, key, (time.time() - started, text, None)))
+                continue
+
+            transcript = engine.transcribe(path)
+            conn = ensure_connection(conn)
+            transcription_id = log_transcription(conn, os.path.basename(path), transcript)
+            results.put(("done", pid, key, (time.time() - started, None, transcription_id)))
+        except Exception:
+            results.put(("error", pid, key, traceback.format_exc()))
+
+    if conn is not None:
+        conn.close()
+
+# ----------------------------
+# Pool
+# ----------------------------
+
+class WorkerPool:
+    """
+    Fixed-size pool of Whisper worker processes.
+
+    The watcher only submits as many files as there are free slots, so the
+    job queue never holds more than one file per worker and the watcher
+    keeps control over ordering. A worker that runs past `timeout` seconds
+    on one file is killed and replaced.
+    """
+
+    def __init__(self, size, model_name=WHISPER_MODEL, timeout=1500):
+        self.size = size
+        self.model_name = model_name
+        self.timeout = timeout
+        # torch does not survive fork() reliably, always start clean.
+        self._ctx = mp.get_context("spawn")
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._workers = {}
+        self.in_flight = {}
+
+    def start(self):
+        for _ in range(self.size):
+            self._spawn()
+
+    def _spawn(self):
+        proc = self._ctx.Process(
+            target=worker_loop,
+            args=(self._jobs, self._results, self.model_name),
+            daemon=True
+        )
+        proc.start()
+        self._workers[proc.pid] = proc
+
+    def free_slots(self):
+        # A batch holds one worker however many files it carries.
+        return self.size - len({state["job"] for state in self.in_flight.values()})
+
+    def submit(self, path, model_name=None, span=None, seq=None):
+        """Queue a whole file, or with span=(start, end) one slice of it."""
+        key = path if span is None else f"{path}#{seq}"
+        self._track(key, path, key)
+        self._jobs.put((key, path, model_name or self.model_name, span))
+        return key
+
+    def submit_batch(self, paths, model_name=None):
+        """Queue several short whole files for one batched decode."""
+        for path in paths:
+            self._track(path, path, paths[0])
+        self._jobs.put(("batch", list(paths), model_name or self.model_name))
+        return list(paths)
+
+    def submit_sources(self, items, model_name=None, max_sec=15.0):
+        """
+        Queue archived clips as one job. items are (key, label, source);
+        results carry the text and are not written to the database.
+        """
+        for key, label, _ in items:
+            self._track(key, label, items[0][0])
+        self._jobs.put(("sources", [(key, source) for key, _, source in items],
+                        model_name or self.model_name, max_sec))
+        return [key for key, _, _ in items]
+
+    def _track(self, key, path, job):
+        self.in_flight[key] = {"path": path, "job": job, "pid": None,
+                               "started": None, "submitted": time.time()}
+
+    def collect(self, timeout):
+        """
+        Wait up to `timeout` seconds for finished jobs and return them as a
+        list of JobResult. Returns early as soon as something finishes.
+        """
+        finished = []
+        deadline = time.time() + timeout
+
+        while True:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0 and not finished:
+                    kind, pid, key, payload = self._results.get(timeout=remaining)
+                else:
+                    kind, pid, key, payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == "fatal":
+                raise RuntimeError(f"Whisper worker {pid} failed to start:\n{payload}")
+
+            if kind == "start":
+                if key in self.in_flight:
+                    self.in_flight[key]["pid"] = pid
+                    self.in_flight[key]["started"] = payload
+                continue
+
+            state = self.in_flight.pop(key, None)
+            if state is None:
+                # Already reported as timed out; the late result is dropped.
+                continue
+            if kind == "done":
+                elapsed, text, transcription_id = payload
+                finished.append(JobResult(key, state["path"], True, None, elapsed, text, transcription_id))
+            else:
+                finished.append(JobResult(key, state["path"], False, payload, None, None, None))
+
+        finished.extend(self._reap())
+        return finished
+
+    def _reap(self):
+        """
+        Kill workers stuck past the timeout and replace dead ones. A job no
+        worker has claimed within the timeout (lost with a worker that died
+        while taking it off the queue) is failed as well.
+        """
+        failed = []
+        now = time.time()
+
+        for key, state in list(self.in_flight.items()):
+            pid = state["pid"]
+            if pid is None:
+                if now - state["submitted"] > self.timeout:
+                    del self.in_flight[key]
+                    failed.append(JobResult(key, state["path"], False, "never started",
+                                            now - state["submitted"], None, None))
+                continue
+            proc = self._workers.get(pid)
+            timed_out = now - state["started"] > self.timeout
+            died = proc is None or not proc.is_alive()
+            if not (timed_out or died):
+                continue
+
+            if proc is not None:
+                if proc.is_alive():
+                    proc.terminate()
+                proc.join(5)
+                del self._workers[pid]
+                self._spawn()
+
+            del self.in_flight[key]
+            reason = "timeout" if timed_out else "worker exited"
+            failed.append(JobResult(key, state["path"], False, reason, now - state["started"], None, None))
+
+        for pid, proc in list(self._workers.items()):
+            if not proc.is_alive():
+                del self._workers[pid]
+                self._spawn()
+
+        return failed
+
+    def stop(self):
+        for _ in self._workers:
+            self._jobs.put(None)
+        for proc in self._workers.values():
+            proc.join(10)
+            if proc.is_alive():
+                proc.terminate()
+        self._workers.clear()
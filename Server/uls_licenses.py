@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Offline amateur licence lookups from the FCC ULS bulk files.
+
+The FCC publishes the full amateur database every week (l_amat.zip) and
+the day's changes every day (l_am_<day>.zip). Both hold pipe-delimited
+record files; this module reads three of them:
+
+  HD.dat   licence header: call sign, status (A active, C cancelled,
+           E expired, T terminated), grant/expiry/cancellation dates
+  EN.dat   licensee name and address
+  AM.dat   operator class
+
+Records are keyed by the ULS unique system identifier and kept in a local
+SQLite file (ULS_DB) with an index on the call sign. A weekly file
+replaces the table; daily files are upserted on top of it. Files already
+imported (same name, size and mtime) are skipped, so the importer can be
+pointed at a download directory on a timer:
+
+  python3 uls_licenses.py l_amat.zip
+  python3 uls_licenses.py downloads/l_am_*.zip
+  python3 uls_licenses.py --check K7NQN
+
+callsign_extractor.py and callsign_validator.py use LicenseLookup to
+validate US callsigns without QRZ.
+"""
+
+import os
+import io
+import re
+import sys
+import time
+import sqlite3
+import zipfile
+import argparse
+
+ULS_DB = os.getenv("ULS_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uls_licenses.sqlite3"))
+IMPORT_CHUNK = 20000  # records per executemany
+
+# US amateur calls: K, N or W prefix, or AA-AL.
+US_CALLSIGN = re.compile(r"^(?:[KNW][A-Z]?|A[A-L])\d[A-Z]{1,3}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS licenses (
+    usi INTEGER PRIMARY KEY,
+    callsign TEXT NOT NULL,
+    status TEXT,
+    grant_date TEXT,
+    expired_date TEXT,
+    cancellation_date TEXT,
+    operator_class TEXT,
+    name TEXT,
+    city TEXT,
+    state TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_licenses_callsign ON licenses (callsign, status);
+CREATE TABLE IF NOT EXISTS imports (
+    fingerprint TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+"""
+
+# record type -> (upsert statement, row builder from the split fields)
+UPSERTS = {
+    "HD": (
+        """
+        INSERT INTO licenses (usi, callsign, status, grant_date, expired_date, cancellation_date)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (usi) DO UPDATE SET
+            callsign = excluded.callsign,
+            status = excluded.status,
+            grant_date = excluded.grant_date,
+            expired_date = excluded.expired_date,
+            cancellation_date = excluded.cancellation_date
+        """,
+        lambda f: (f[4], f[5], _date(f[7]), _date(f[8]), _date(f[9])),
+    ),
+    "EN": (
+        """
+        INSERT INTO licenses (usi, callsign, name, city, state)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (usi) DO UPDATE SET
+            name = excluded.name,
+            city = excluded.city,
+            state = excluded.state
+        """,
+        lambda f: (f[4], f[7] or " ".join(p for p in (f[8], f[10]) if p), f[16], f[17]),
+    ),
+    "AM": (
+        """
+        INSERT INTO licenses (usi, callsign, operator_class)
+        VALUES (?, ?, ?)
+        ON CONFLICT (usi) DO UPDATE SET operator_class = excluded.operator_class
+        """,
+        lambda f: (f[4], f[5]),
+    ),
+}
+MIN_FIELDS = {"HD": 10, "EN": 18, "AM": 6}
+
+def _date(value):
+    """ULS MM/DD/YYYY -> YYYY-MM-DD (empty -> None)."""
+    if not value:
+        return None
+    month, day, year = value.split("/")
+    return f"{year}-{month}-{day}"
+
+def is_us_callsign(callsign):
+    return bool(US_CALLSIGN.match(callsign.upper()))
+
+def open_db(path=None):
+    conn = sqlite3.connect(path or ULS_DB)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+# ----------------------------
+# Import
+# ----------------------------
+
+def read_records(source, record_type):
+    """Yield split fields of every `record_type` line in a zip or directory."""
+    name = f"{record_type}.dat"
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            members = [m for m in zf.namelist() if os.path.basename(m).upper() == name.upper()]
+            if not members:
+                return
+            with zf.open(members[0]) as raw:
+                yield from _split_lines(io.TextIOWrapper(raw, encoding="latin-1", newline=""))
+    else:
+        path = os.path.join(source, name)
+        if os.path.exists(path):
+            with open(path, encoding="latin-1", newline="") as fh:
+                yield from _split_lines(fh)
+
+def _split_lines(fh):
+    for line in fh:
+        fields = line.rstrip("\r\n").split("|")
+        if fields[0] in MIN_FIELDS and len(fields) >= MIN_FIELDS[fields[0]] and fields[1].isdigit():
+            yield fields
+
+def fingerprint(source):
+    st = os.stat(source)
+    return f"{os.path.basename(os.path.normpath(source))}:{st.st_size}:{int(st.st_mtime)}"
+
+def import_file(conn, source, full=None):
+    """
+    Import one weekly (full) or daily (incremental) file. Returns the
+    number of records read, or None when this file was imported already.
+    """
+    key = fingerprint(source)
+    if conn.execute("SELECT 1 FROM imports WHERE fingerprint = ?", (key,)).fetchone():
+        print(f"[ULS] {source} already imported, skipping.")
+        return None
+    if full is None:
+        full = os.path.basename(os.path.normpath(source)).lower().startswith("l_amat")
+
+    started = time.time()
+    total = 0
+    conn.execute("PRAGMA synchronous=OFF")
+    try:
+        with conn:
+            if full:
+                conn.execute("DELETE FROM licenses")
+            # HD first so EN/AM rows update a licence that already has its call sign and status.
+            for record_type in ("HD", "EN", "AM"):
+                sql, build = UPSERTS[record_type]
+                batch = []
+                for fields in read_records(source, record_type):
+                    batch.append((int(fields[1]),) + build(fields))
+                    if len(batch) >= IMPORT_CHUNK:
+                        conn.executemany(sql, batch)
+                        total += len(batch)
+                        batch = []
+                if batch:
+                    conn.executemany(sql, batch)
+                    total += len(batch)
+            conn.execute(
+                "INSERT INTO imports (fingerprint, filename, kind, records, imported_at) VALUES (?, ?, ?, ?, ?)",
+                (key, os.path.abspath(source), "full" if full else "daily", total, time.time())
+            )
+    finally:
+        conn.execute("PRAGMA synchronous=NORMAL")
+    print(f"[ULS] Imported {total} records from {source} ({'full' if full else 'daily'}) "
+          f"in {time.time() - started:.1f}s")
+    return total
+
+# ----------------------------
+# Lookup
+# ----------------------------
+
+class LicenseLookup:
+    """
+    Read-only callsign -> licensed check against ULS_DB. `available` is
+    False when no import has been done yet, in which case check() returns
+    None (unknown) for everything.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or ULS_DB
+        self.conn = None
+        if os.path.exists(self.path):
+            self.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            try:
+                imported = self.conn.execute("SELECT 1 FROM imports LIMIT 1").fetchone()
+            except sqlite3.Error:
+                imported = None
+            if not imported:
+                self.conn.close()
+                self.conn = None
+
+    @property
+    def available(self):
+        return self.conn is not None
+
+    def check(self, callsign):
+        """True if there is an active licence, False if not, None if unknown (no data / not a US call)."""
+        if self.conn is None or not is_us_callsign(callsign):
+            return None
+        row = self.conn.execute(
+            "SELECT 1 FROM licenses WHERE callsign = ? AND status = 'A' LIMIT 1", (callsign.upper(),)
+        ).fetchone()
+        return row is not None
+
+def main():
+    parser = argparse.ArgumentParser(description="Import FCC ULS amateur licence files for offline validation.")
+    parser.add_argument("sources", nargs="*", help="l_amat.zip / l_am_<day>.zip files or unpacked directories, oldest first")
+    parser.add_argument("--full", action="store_true", help="treat every source as a full weekly file")
+    parser.add_argument("--db", default=ULS_DB)
+    parser.add_argument("--check", nargs="+", metavar="CALLSIGN", help="look callsigns up instead of importing")
+    args = parser.parse_args()
+
+    if args.check:
+        lookup = LicenseLookup(args.db)
+        if not lookup.available:
+            print(f"[ULS] No data in {args.db}; import l_amat.zip first.")
+            sys.exit(1)
+        for callsign in args.check:
+            result = lookup.check(callsign)
+            print(f"{callsign.upper()}: {'not a US call' if result is None else 'ACTIVE' if result else 'NOT LICENSED'}")
+        return
+
+    if not args.sources:
+        parser.error("nothing to import")
+    conn = open_db(args.db)
+    try:
+        for source in args.sources:
+            import_file(conn, source, full=True if args.full else None)
+        active = conn.execute("SELECT COUNT(DISTINCT callsign) FROM licenses WHERE status = 'A'").fetchone()[0]
+        print(f"[ULS] {active} active callsigns in {args.db}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()